@@ -0,0 +1,85 @@
+"""Flat, padded representation of a cave map built once per map by parse_map.
+
+Cells are stored row-major in a byte array with a one-cell wall border, so
+every neighbour of a real cell is a valid index and ragged rows are simply
+padded with walls. `neighbor[cell * 4 + d]` is the adjacent cell in direction
+d, `step[cell * 4 + d]` is where a plain move ends up (walls and pits block, as
+in get_safe_next_position), and the walkable/wall/pit/bridge/gold/wumpus/stairs
+masks answer "what is here" with a single array read.
+"""
+from array import array
+
+DIRECTIONS = {"NORTH": 0, "SOUTH": 1, "EAST": 2, "WEST": 3}
+OFFSETS = [(0, -1), (0, 1), (1, 0), (-1, 0)]  # (column, row) per direction
+WALL = ord('X')
+
+
+class CaveMap:
+    __slots__ = ('rows', 'width', 'height', 'stride', 'cells', 'neighbor', 'step',
+                 'walkable', 'wall', 'pit', 'bridge', 'gold', 'wumpus', 'stairs')
+
+    def __init__(self, rows):
+        self.rows = [str(row) for row in rows]
+        self.height = len(self.rows)
+        self.width = max((len(row) for row in self.rows), default=0)
+        self.stride = self.width + 2
+        size = self.stride * (self.height + 2)
+
+        cells = bytearray(b'X') * size
+        for r, row in enumerate(self.rows):
+            start = (r + 1) * self.stride + 1
+            cells[start:start + len(row)] = row.encode('latin-1', 'replace')
+        self.cells = cells
+
+        def mask(test):
+            return bytearray(1 if test(c) else 0 for c in cells)
+
+        self.wall = mask(lambda c: c == WALL)
+        self.pit = mask(lambda c: c == ord('P'))
+        self.walkable = mask(lambda c: c != WALL and c != ord('P'))
+        self.bridge = mask(lambda c: c == ord('B'))
+        self.gold = mask(lambda c: c == ord('G'))
+        self.wumpus = mask(lambda c: c == ord('W'))
+        self.stairs = mask(lambda c: c == ord('S'))
+
+        offsets = [dc + dr * self.stride for dc, dr in OFFSETS]
+        neighbor = array('i', [0]) * (size * 4)
+        step = array('i', [0]) * (size * 4)
+        for f in range(size):
+            for d, offset in enumerate(offsets):
+                n = f + offset
+                if not 0 <= n < size:
+                    n = f  # Only border cells, which are never walkable
+                neighbor[f * 4 + d] = n
+                step[f * 4 + d] = n if self.walkable[n] else f
+        self.neighbor = neighbor
+        self.step = step
+
+    def contains(self, position):
+        col, row = position
+        return 0 <= row < self.height and 0 <= col < self.width
+
+    def flat(self, position):
+        """Flat index of an in-bounds (column, row) position."""
+        return (position[1] + 1) * self.stride + position[0] + 1
+
+    def position(self, f):
+        """(column, row) of a flat index."""
+        return (f % self.stride - 1, f // self.stride - 1)
+
+    def at(self, position):
+        """Map character at (column, row); anything outside the map is a wall."""
+        if not self.contains(position):
+            return 'X'
+        return chr(self.cells[self.flat(position)])
+
+    def is_walkable(self, position):
+        return self.contains(position) and bool(self.walkable[self.flat(position)])
+
+    def walkable_cells(self):
+        """Flat indices of all walkable cells in row-major order."""
+        return [f for f, w in enumerate(self.walkable) if w]
+
+    def locations(self, mask):
+        """(column, row) of every cell set in one of the masks, row-major."""
+        return [self.position(f) for f, m in enumerate(mask) if m]
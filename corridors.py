@@ -0,0 +1,71 @@
+"""Corridor compression of the navigation graph.
+
+Most caves are one-cell-wide corridors, and every corridor cell only passes
+value along. A corridor cell is a plain walkable cell (no gold, bridge, wumpus
+or stairs) with exactly two walkable neighbours and no pit next to it. Chains of
+such cells become single macro moves between the cells at their ends (the
+nodes), and the planner only solves the nodes. When the agent is inside a
+corridor it still returns single-step actions: the direction of the macro move
+with the best backup against the solved node values.
+
+Only valid for the deterministic rules; with slips the agent can leave a
+corridor sideways, so the full model is used instead.
+"""
+from factored_planner import FactoredPlanner
+from transition_model import (GAMMA, bridge_probability, build_transition_model,
+                              fight_probability)
+
+
+def corridor_cells(cave):
+    """Flat indices of every corridor cell in the cave."""
+    corridors = set()
+    for f in cave.walkable_cells():
+        if cave.gold[f] or cave.bridge[f] or cave.wumpus[f] or cave.stairs[f]:
+            continue
+        around = cave.neighbor[f * 4:f * 4 + 4]
+        if any(cave.pit[n] for n in around):
+            continue
+        if sum(cave.walkable[n] for n in around) == 2:
+            corridors.add(f)
+    return corridors
+#---------------------------------------------------------------------------------------
+class CorridorPlanner(FactoredPlanner):
+    """FactoredPlanner over corridor-compressed models; solves the nodes only."""
+
+    def __init__(self, cave, gold_locations, agility=0, fighting=0, slip=False, models=None, **kwargs):
+        if slip:
+            raise ValueError("corridor compression needs the deterministic rules")
+        super().__init__(cave, gold_locations, agility, fighting, slip, models, **kwargs)
+        self.corridors = corridor_cells(cave)
+        self._rows = {}  # defeated mask -> weighted rows, for moves inside corridors
+
+    def build_model(self, defeated):
+        return build_transition_model(self.cave, defeated, corridors=self.corridors, gamma=GAMMA)
+
+    def rows(self, killed):
+        rows = self._rows.get(killed)
+        if rows is None:
+            rows = self.model(killed).weighted_rows(bridge_probability(self.agility), fight_probability(self.fighting))
+            self._rows[killed] = rows
+        return rows
+
+    def action(self, position, gold_collected, defeated_wumpus_locations=()):
+        with self._lock:
+            killed = self.killed_mask(defeated_wumpus_locations)
+            model = self.model(killed)
+            cell = model.index.get(tuple(position))
+            if cell is None:
+                return None
+            reach = self._reach.get(killed, set())
+            if cell in reach or cell in model.nodes or not model.neighbors(cell) <= reach:
+                return super().action(position, gold_collected, defeated_wumpus_locations)
+
+            # Inside a corridor whose ends are solved: walk towards the better end
+            solution = self._solutions[killed]
+            return solution.lookahead(self.rows(killed), cell, solution.mask(gold_collected),
+                                      self._fight_values[killed])
+
+    def state_counts(self):
+        """(solved cells, walkable cells) of the base model, for comparing with the full solve."""
+        model = self.model(0)
+        return len(model.nodes), len(model.cells)
@@ -1,29 +1,101 @@
+import os
+import json
+import glob
 import random
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
 from itertools import chain, combinations
+import telemetry
+from cave_map import DIRECTIONS, CaveMap
+from corridors import CorridorPlanner
+from factored_planner import FactoredPlanner
+from hierarchy import HierarchicalPlanner, find_rooms
+from rtdp import RTDPPlanner
+from skill_allocation import best_skill_allocation, remember_allocation
+from solver_selection import estimate_state_space, select_strategy
+from value_store import MemmapStore, MemoryStore
 
 # Constants
 GAMMA = 0.99  # Increased discount factor to prioritize future rewards
 EPSILON = 1e-6  # Convergence threshold
 # ACTIONS = ["NORTH", "SOUTH", "EAST", "WEST", "EXIT", "FIGHT"]
 ACTIONS = ["NORTH", "SOUTH", "EAST", "WEST", "EXIT"]
+SLIP_MOVES = False  # Plan with the 10% left/right slips of example(W).py
+PLANNING_MODE = "auto"  # "auto" picks per map (solver_selection.py); or "exhaustive", "hierarchical", "focused", "anytime"
+ANYTIME_BUDGET = 0.2  # Seconds of RTDP trials per decision on maps too large for anything else
+CORRIDOR_COMPRESSION = True  # Solve corridor ends only (deterministic rules)
+IN_MEMORY_VALUE_BYTES = 512 * 2**20  # Above this the value/policy blocks go to memory-mapped files
+VALUE_WORKING_SET_BYTES = 64 * 2**20  # Mapped bytes per planner when they do, shared by its defeated-wumpus blocks
+VALUE_STORE_DIR = None  # Directory for those files (None = system temp dir)
+PLANNER_SOCKET = os.environ.get("WUMPUS_PLANNER_SOCKET")  # Ask a running policy_daemon.py first (None = always solve locally)
+WARM_UP = True  # Pre-solve the maps found in the agent configs before connecting
+WARM_UP_ALL_CONFIGS = False  # Scan every *.json next to the given config, not just that one
+WARM_UP_FREE_SKILL_POINTS = (6,)  # Free skill points to pre-solve for when a config does not say
+WARM_UP_WORKERS = None  # Warm-up process pool size (None = one per CPU)
+MAP_CHARACTERS = set("XSGWPB \r\n")
+PLAN_FOLLOWING = True  # Replay the stored expected trajectory while the run goes as predicted
+PLAN_HORIZON = 1000  # Steps per stored trajectory
+TELEMETRY_LEVEL = telemetry.INFO  # Events recorded when run as a script (telemetry.DEBUG adds requests and dice rolls)
+TELEMETRY_PATH = None  # JSON-lines file, "{pid}" = process id (None = stdout)
+TELEMETRY_SAMPLE = {}  # Event name -> fraction kept, e.g. {"bridge_roll": 0.1}
+MAX_CACHED_MAPS = 32  # Caves kept in memory; the least recently used map is dropped first
+MAX_CACHED_PLANNERS = 64  # Planners (and stored plans) kept, per (map, agility, fighting)
+
+# Planners are kept per (map, agility, fighting) so a run does not re-solve every step;
+# parallel runs share them, and a planner's own lock covers its re-plans
+_planner_cache = OrderedDict()
+# CaveMaps are read-only, so every request of a run shares the one built for its map
+_cave_cache = OrderedDict()
+# (map, agility, fighting) -> (history length of the first step, [(expected state, action)])
+_plans = OrderedDict()
+_cache_lock = threading.Lock()  # Guards the LRU order of the caches above
+# (map, total skill points) -> planning strategy chosen for it
+_mode_cache = {}
 
 # Helper functions
 #---------------------------------------------------------------------------------------
+"""Look up `key` in an LRU cache (an OrderedDict) and mark it as recently used."""
+def cache_get(cache, key):
+    with _cache_lock:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+#---------------------------------------------------------------------------------------
+"""Store `value` in an LRU cache, dropping the least recently used entries above `limit`.
+
+With `replace=False` an entry that is already there wins and is returned instead,
+so threads that built the same thing at once all end up sharing one of them.
+"""
+def cache_put(cache, key, value, limit, replace=True):
+    with _cache_lock:
+        if replace or key not in cache:
+            cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > limit:
+            cache.popitem(last=False)
+        return cache[key]
+#---------------------------------------------------------------------------------------
 """Generate all possible subsets of a given iterable.""" #DONE
 def powerset(gold_locations):
     s = list(gold_locations)
     return chain.from_iterable(combinations(s, r) for r in range(len(s) + 1))
 #---------------------------------------------------------------------------------------
-"""Parse the map into a 2D list and extract key locations (S,G,W,P).""" #DONE
+"""Parse the map into a CaveMap and extract key locations (S,G,W,P).""" #DONE
 def parse_map(raw_map):
-    grid = [list(row) for row in raw_map.split('\n') if row.strip()]
+    rows = [row for row in raw_map.split('\n') if row.strip()]
+    cave = cache_get(_cave_cache, raw_map)
+    if cave is None:
+        cave = cache_put(_cave_cache, raw_map, CaveMap(rows), MAX_CACHED_MAPS, replace=False)
     start_pos = None
     # List of tubles 
     gold_locations = []
     wumpus_locations = []
     pits_locations = []
-    for row_idx, line in enumerate(grid):
+    for row_idx, line in enumerate(rows):
         for col_idx, cell in enumerate(line):
             if cell == 'G':
                 gold_locations.append((col_idx, row_idx))
@@ -35,37 +107,22 @@ def parse_map(raw_map):
                 pits_locations.append((col_idx, row_idx))
     
     # Return elements positions
-    return grid, gold_locations, start_pos, wumpus_locations, pits_locations
+    return cave, gold_locations, start_pos, wumpus_locations, pits_locations
 #---------------------------------------------------------------------------------------
-"""Return a list of all coordinates (column, row) in the grid that are walkable.""" #DONE
-def get_walkable_positions(grid):
-    walkable_positions = []
-    for row_idx in range(len(grid)):
-        for col_idx in range(len(grid[0])):
-            # Walkable if not a wall or pit
-            if grid[row_idx][col_idx] != 'X' and grid[row_idx][col_idx] != 'P':  
-                walkable_positions.append((col_idx, row_idx))
-    
-    # Return walkable positions
-    return walkable_positions
+"""Return a list of all coordinates (column, row) in the cave that are walkable.""" #DONE
+def get_walkable_positions(cave):
+    # Walkable if not a wall or pit
+    return [cave.position(f) for f in cave.walkable_cells()]
 #---------------------------------------------------------------------------------------
 """Check if a position is within bounds and not a wall or pit.""" #DONE
-def is_next_position_walkable(position, grid, skill_points=None):
-    col, row = position
-    if 0 <= row < len(grid) and 0 <= col < len(grid[0]):
-        # Check if it's not a wall or pit
-        if grid[row][col] != 'X' and grid[row][col] != 'P':
-            
-            # Next position is walkable
-            return True
-    # Next position is not walkable
-    return False
+def is_next_position_walkable(position, cave, skill_points=None):
+    return cave.is_walkable(position)
 
 #---------------------------------------------------------------------------------------
 """Attempt to cross a bridge using agility dice rolls."""
 def attempt_bridge_crossing(current_position, agility_skill):
     if agility_skill <= 0:
-        print("No agility points - cannot attempt bridge crossing")
+        telemetry.event("bridge_no_agility", telemetry.WARNING, position=current_position)
         return current_position
         
     dice_rolls = [random.randint(1, 6) for _ in range(agility_skill)]
@@ -77,12 +134,12 @@ def attempt_bridge_crossing(current_position, agility_skill):
     return score >= 12
 #---------------------------------------------------------------------------------------
 """Determine next valid positions based on the action."""
-def get_possible_next_positions(position, action, grid):
+def get_possible_next_positions(position, action, cave):
     """
     Determine valid next positions based on the action, avoiding pits and walls.
     """
     if action == "EXIT":
-        if grid[position[1]][position[0]] == 'S':
+        if cave.at(position) == 'S':
             return {position}
         else:
             return set()
@@ -90,52 +147,24 @@ def get_possible_next_positions(position, action, grid):
     if action == "FIGHT":
         return {position}
 
-    directions = {
-        "NORTH": (0, -1),
-        "SOUTH": (0, 1),
-        "EAST": (1, 0),
-        "WEST": (-1, 0)
-    }
-
-    dc, dr = directions[action]
-    new_col = position[0] + dc
-    new_row = position[1] + dr
-    new_pos = (new_col, new_row)
-
-    # Only return walkable positions (pits are treated as walls)
-    if is_next_position_walkable(new_pos, grid):
-        return {new_pos}
-    else:
-        return {position}
+    # Only walkable positions are reached (pits are treated as walls)
+    return {cave.position(cave.step[cave.flat(position) * 4 + DIRECTIONS[action]])}
 #---------------------------------------------------------------------------------------
-def get_safe_next_position(current_position, action, grid, skill_points):
+def get_safe_next_position(current_position, action, cave, skill_points):
     """
     Determines if the next position is safe. Treats pits as walls.
     """
-    directions = {
-        "NORTH": (0, -1),
-        "SOUTH": (0, 1),
-        "EAST": (1, 0),
-        "WEST": (-1, 0)
-    }
-
-    if action not in directions:
+    if action not in DIRECTIONS:
         return current_position
 
-    dc, dr = directions[action]
-    new_col = current_position[0] + dc
-    new_row = current_position[1] + dr
-
-    if not (0 <= new_row < len(grid) and 0 <= new_col < len(grid[0])):
-        return current_position
-
-    next_cell = grid[new_row][new_col]
+    # Cells outside the map are padding walls
+    next_cell = cave.neighbor[cave.flat(current_position) * 4 + DIRECTIONS[action]]
 
     # Handle bridges with agility checks
-    if next_cell == 'B':
+    if cave.bridge[next_cell]:
         agility_skill = skill_points.get("agility", 0)
         if agility_skill <= 0:
-            print("Agility skill too low. Cannot attempt crossing.")
+            telemetry.event("bridge_no_agility", telemetry.WARNING, position=current_position, action=action)
             return None
 
         while True:
@@ -144,22 +173,21 @@ def get_safe_next_position(current_position, action, grid, skill_points):
             top_dice = dice_rolls[:3]
             score = sum(top_dice)
 
-            print(f"Rolling Dice: {dice_rolls}, Top 3 = {top_dice}, Score = {score}")
+            if telemetry.enabled(telemetry.DEBUG):
+                telemetry.event("bridge_roll", telemetry.DEBUG, rolls=dice_rolls, top=top_dice, score=score,
+                                success=score >= 12)
 
             if score >= 12:
-                print("✅ Bridge crossing successful!")
-                return (new_col, new_row)
-            else:
-                print("❌ Failed roll. Retrying...")
+                return cave.position(next_cell)
 
     # Pits and walls are not walkable
-    if next_cell in ('X', 'P'):
+    if not cave.walkable[next_cell]:
         return current_position
 
-    return (new_col, new_row)
+    return cave.position(next_cell)
 #---------------------------------------------------------------------------------------
 """Compute the reward for a given transition."""
-def get_reward(position, action, next_position, gold_collected, gold_locations, start_pos, wumpus_locations, defeated_wumpus_locations, grid, skill_points):
+def get_reward(position, action, next_position, gold_collected, gold_locations, start_pos, wumpus_locations, defeated_wumpus_locations, cave, skill_points):
     reward = -0.1  # Base step penalty
 
     # Penalize for invalid moves (blocked by wall/pit)
@@ -181,9 +209,9 @@ def get_reward(position, action, next_position, gold_collected, gold_locations,
 
     return reward
 #---------------------------------------------------------------------------------------
-def get_transition_prob(position, action, next_position, grid):
+def get_transition_prob(position, action, next_position, cave):
     if action == "EXIT":
-        if grid[position[1]][position[0]] == 'S' and next_position == position:
+        if cave.at(position) == 'S' and next_position == position:
             return 1.0
         else:
             return 0.0
@@ -191,21 +219,11 @@ def get_transition_prob(position, action, next_position, grid):
     if action == "FIGHT":
         return 1.0 if next_position == position else 0.0
 
-    directions = {
-        "NORTH": (0, -1),
-        "SOUTH": (0, 1),
-        "EAST": (1, 0),
-        "WEST": (-1, 0)
-    }
-    dc, dr = directions[action]
-    new_col = position[0] + dc
-    new_row = position[1] + dr
-    new_pos = (new_col, new_row)
-    actual_next_pos = new_pos if is_next_position_walkable(new_pos, grid) else position
+    actual_next_pos = cave.position(cave.step[cave.flat(position) * 4 + DIRECTIONS[action]])
     return 1.0 if next_position == actual_next_pos else 0.0
 #---------------------------------------------------------------------------------------
-def policy_iteration(grid, gold_locations, start_pos, wumpus_locations, defeated_wumpus_locations, skill_points):
-    walkable_positions = get_walkable_positions(grid)
+def policy_iteration(cave, gold_locations, start_pos, wumpus_locations, defeated_wumpus_locations, skill_points):
+    walkable_positions = get_walkable_positions(cave)
     states = [(pos, frozenset(gold_collected)) for pos in walkable_positions for gold_collected in powerset(gold_locations)]
     
     # Initialize policy and value function
@@ -221,12 +239,12 @@ def policy_iteration(grid, gold_locations, start_pos, wumpus_locations, defeated
                 v = V[state]
                 action = policy[state]
                 total = 0
-                for next_position in get_possible_next_positions(position, action, grid):
+                for next_position in get_possible_next_positions(position, action, cave):
                     next_gold_collected = set(gold_collected)
                     if next_position in gold_locations and next_position not in gold_collected:
                         next_gold_collected.add(next_position)
-                    reward = get_reward(position, action, next_position, gold_collected, gold_locations, start_pos, wumpus_locations, defeated_wumpus_locations, grid, skill_points)
-                    prob = get_transition_prob(position, action, next_position, grid)
+                    reward = get_reward(position, action, next_position, gold_collected, gold_locations, start_pos, wumpus_locations, defeated_wumpus_locations, cave, skill_points)
+                    prob = get_transition_prob(position, action, next_position, cave)
                     next_state = (next_position, frozenset(next_gold_collected))
                     total += prob * (reward + GAMMA * V[next_state])
                 V[state] = total
@@ -243,17 +261,17 @@ def policy_iteration(grid, gold_locations, start_pos, wumpus_locations, defeated
             best_value = -float('inf')
             for action in ACTIONS:
                 total = 0
-                for next_position in get_possible_next_positions(position, action, grid):
+                for next_position in get_possible_next_positions(position, action, cave):
                     # Skip actions that lead directly into pits
-                    if grid[next_position[1]][next_position[0]] == 'P':
+                    if cave.at(next_position) == 'P':
                         continue
 
                     next_gold_collected = set(gold_collected)
                     if next_position in gold_locations and next_position not in gold_collected:
                         next_gold_collected.add(next_position)
 
-                    reward = get_reward(position, action, next_position, gold_collected, gold_locations, start_pos, wumpus_locations, defeated_wumpus_locations, grid, skill_points)
-                    total += get_transition_prob(position, action, next_position, grid) * (reward + GAMMA * V[(next_position, frozenset(next_gold_collected))])
+                    reward = get_reward(position, action, next_position, gold_collected, gold_locations, start_pos, wumpus_locations, defeated_wumpus_locations, cave, skill_points)
+                    total += get_transition_prob(position, action, next_position, cave) * (reward + GAMMA * V[(next_position, frozenset(next_gold_collected))])
 
                 if total > best_value:
                     best_value = total
@@ -274,28 +292,203 @@ def fight_wumpus(fighting_skill):
     score = sum(dice_rolls[:3])
     return score >= 13
 #---------------------------------------------------------------------------------------
-def print_grid(grid, agent_position):
-    grid_copy = [row[:] for row in grid]
+def print_grid(cave, agent_position):
+    grid_copy = [list(row) for row in cave.rows]
     col, row = agent_position
     grid_copy[row][col] = 'A'  # Mark the agent's position with 'A'
     for row in grid_copy:
         print(''.join(row))
     print()
 #---------------------------------------------------------------------------------------
+"""Keep the value blocks in memory unless cells x 2^gold x 2^wumpus (float64 + uint8 each) would not fit.
+
+A planner makes one store per defeated-wumpus mask, so each memory-mapped store
+gets a 2^wumpus share of VALUE_WORKING_SET_BYTES.
+"""
+def value_store_factory(cave, gold_locations):
+    wumpuses = sum(cave.wumpus)
+    states = sum(cave.walkable) << len(gold_locations) << wumpuses
+    if states * 9 <= IN_MEMORY_VALUE_BYTES:
+        return MemoryStore
+    return partial(MemmapStore, directory=VALUE_STORE_DIR, working_set_bytes=VALUE_WORKING_SET_BYTES >> wumpuses)
+#---------------------------------------------------------------------------------------
+"""Planning strategy for a map: PLANNING_MODE, or the cheapest one that fits when it is "auto".
+
+`skill_points` is the total (free points at the first request, agility +
+fighting afterwards), so every request of a run gets the same strategy.
+"""
+def planning_mode(game_map, skill_points):
+    if PLANNING_MODE != "auto":
+        return PLANNING_MODE
+    key = (game_map, skill_points)
+    mode = _mode_cache.get(key)
+    if mode is None:
+        cave, gold_locations, _, _, _ = parse_map(game_map)
+        estimate = estimate_state_space(cave, gold_locations, slip=SLIP_MOVES, skill_points=skill_points)
+        mode = _mode_cache[key] = select_strategy(estimate)
+        telemetry.event("planning_strategy", telemetry.INFO, mode=mode, **estimate)
+    return mode
+#---------------------------------------------------------------------------------------
+"""Planner class and constructor options for a strategy; room and corridor compression need deterministic moves,
+and room paths only pay off when portals split the cave into at least two rooms."""
+def planner_setup(mode, cave, gold_locations):
+    if mode in ("focused", "anytime"):
+        return RTDPPlanner, {"budget": ANYTIME_BUDGET} if mode == "anytime" else {}
+    if mode == "hierarchical" and not SLIP_MOVES and len(find_rooms(cave)[0]) > 1:
+        planner_class = HierarchicalPlanner
+    elif CORRIDOR_COMPRESSION and not SLIP_MOVES:
+        planner_class = CorridorPlanner
+    else:
+        planner_class = FactoredPlanner
+    return planner_class, {"store_factory": value_store_factory(cave, gold_locations)}
+#---------------------------------------------------------------------------------------
+"""Return the (cached) planner for a map and skill allocation."""
+def get_planner(game_map, skill_points):
+    agility = skill_points.get("agility", 0)
+    fighting = skill_points.get("fighting", 0)
+    key = (game_map, agility, fighting)
+    planner = cache_get(_planner_cache, key)
+    if planner is None:
+        cave, gold_locations, _, _, _ = parse_map(game_map)
+        planner_class, options = planner_setup(planning_mode(game_map, agility + fighting), cave, gold_locations)
+        planner = planner_class(cave, gold_locations, agility, fighting, slip=SLIP_MOVES, **options)
+        planner = cache_put(_planner_cache, key, planner, MAX_CACHED_PLANNERS, replace=False)
+    return planner
+#---------------------------------------------------------------------------------------
+"""Best skill split for a map's first request; its solved planner goes to the planner cache."""
+def allocate_skill_points(game_map, free_skill_points):
+    cave, gold_locations, start_pos, _, _ = parse_map(game_map)
+    planner_class, options = planner_setup(planning_mode(game_map, free_skill_points), cave, gold_locations)
+    skill_allocation, planner = best_skill_allocation(game_map, cave, gold_locations, start_pos, free_skill_points,
+                                                      slip=SLIP_MOVES, planner_class=planner_class, **options)
+    # The chosen split is already solved (or searched); the next request reuses it
+    cache_put(_planner_cache, (game_map, skill_allocation["agility"], skill_allocation["fighting"]), planner,
+              MAX_CACHED_PLANNERS, replace=False)
+    return skill_allocation
+#---------------------------------------------------------------------------------------
+"""Check whether a config string looks like a cave map (several rows of map characters, with stairs)."""
+def looks_like_map(text):
+    rows = [row for row in text.split('\n') if row.strip()]
+    return len(rows) >= 2 and 'S' in text and set(text) <= MAP_CHARACTERS
+#---------------------------------------------------------------------------------------
+"""Collect map -> {free skill points} from any JSON value: "map" keys and map-like strings."""
+def collect_maps(data, maps, free_skill_points=None):
+    if isinstance(data, dict):
+        free_skill_points = data.get("free-skill-points", free_skill_points)
+        for key, value in data.items():
+            if isinstance(value, str) and (key == "map" or looks_like_map(value)):
+                points = maps.setdefault(value, set())
+                points.update([free_skill_points] if free_skill_points else WARM_UP_FREE_SKILL_POINTS)
+            else:
+                collect_maps(value, maps, free_skill_points)
+    elif isinstance(data, list):
+        for value in data:
+            collect_maps(value, maps, free_skill_points)
+    elif isinstance(data, str) and looks_like_map(data):
+        maps.setdefault(data, set()).update(WARM_UP_FREE_SKILL_POINTS)
+    return maps
+#---------------------------------------------------------------------------------------
+"""Maps found in the agent config (or all configs in its directory), best effort."""
+def find_config_maps(config_path):
+    paths = [config_path]
+    if os.path.isdir(config_path):
+        paths = sorted(glob.glob(os.path.join(config_path, '*.json')))
+    elif WARM_UP_ALL_CONFIGS:
+        paths = sorted(glob.glob(os.path.join(os.path.dirname(config_path) or '.', '*.json')))
+
+    maps = {}
+    for path in paths:
+        try:
+            with open(path, encoding='utf-8') as f:
+                collect_maps(json.load(f), maps)
+        except (OSError, ValueError):
+            continue
+    return maps
+#---------------------------------------------------------------------------------------
+"""Warm-up worker: solve every skill split of one map; returns (best allocation, split -> planner)."""
+def solve_all_allocations(game_map, free_skill_points):
+    cave, gold_locations, start_pos, _, _ = parse_map(game_map)
+    planner_class, options = planner_setup(planning_mode(game_map, free_skill_points), cave, gold_locations)
+    planners = {}
+    allocation, _ = best_skill_allocation(game_map, cave, gold_locations, start_pos, free_skill_points,
+                                          slip=SLIP_MOVES, planner_class=planner_class, planners=planners,
+                                          **options)
+    return allocation, planners
+#---------------------------------------------------------------------------------------
+"""Solve the config maps in a process pool and fill the allocation and planner caches."""
+def warm_up(config_path):
+    jobs = [(game_map, free) for game_map, points in find_config_maps(config_path).items() for free in sorted(points)]
+    if not jobs:
+        logging.info("Warm-up: no maps found in %s", config_path)
+        return
+
+    with ProcessPoolExecutor(max_workers=WARM_UP_WORKERS) as pool:
+        futures = {pool.submit(solve_all_allocations, game_map, free): (game_map, free) for game_map, free in jobs}
+        for future in as_completed(futures):
+            game_map, free = futures[future]
+            try:
+                allocation, planners = future.result()
+            except Exception:
+                # e.g. planners on memory-mapped stores cannot be sent back; they are solved on first use
+                logging.exception("Warm-up failed for a map with %d free skill points", free)
+                continue
+            planner = planners[(allocation["agility"], allocation["fighting"])]
+            remember_allocation((game_map, free, SLIP_MOVES, type(planner)), (allocation, planner))
+            for (agility, fighting), planner in planners.items():
+                cache_put(_planner_cache, (game_map, agility, fighting), planner, MAX_CACHED_PLANNERS, replace=False)
+    logging.info("Warm-up: solved %d map/skill-point combinations", len(jobs))
+#---------------------------------------------------------------------------------------
+"""Expected run from `state` if every move goes as intended: [((position, gold, defeated), action)]."""
+def expected_trajectory(planner, cave, gold_locations, state, action, skill_points):
+    position, gold_collected, defeated_wumpus_locations = state
+    trajectory = [(state, action)]
+    while len(trajectory) < PLAN_HORIZON and action in DIRECTIONS:
+        next_cell = cave.step[cave.flat(position) * 4 + DIRECTIONS[action]]
+        if cave.bridge[next_cell] and skill_points.get("agility", 0) <= 0:
+            break  # agent_function looks for an alternative move
+        position = cave.position(next_cell)
+        if position in gold_locations:
+            gold_collected = gold_collected | {position}
+        # The stairs with gold and live wumpuses are handled before planning
+        if (cave.stairs[next_cell] and gold_collected) or \
+                (cave.wumpus[next_cell] and position not in defeated_wumpus_locations):
+            break
+        action = planner.action(position, gold_collected, defeated_wumpus_locations) or "NORTH"
+        trajectory.append(((position, gold_collected, defeated_wumpus_locations), action))
+    return trajectory
+#---------------------------------------------------------------------------------------
+"""Stored action if the run is in the state the stored plan expected at this history length."""
+def follow_plan(game_map, skill_points, step, state):
+    plan = cache_get(_plans, (game_map, skill_points.get("agility", 0), skill_points.get("fighting", 0)))
+    if plan is None:
+        return None
+    start, trajectory = plan
+    i = step - start
+    if 0 <= i < len(trajectory) and trajectory[i][0] == state:
+        return trajectory[i][1]
+    return None
+#---------------------------------------------------------------------------------------
 def agent_function(request_data, request_info):
-    print('_________________________________________________________')
-
     # Parse game state
     game_map = request_data.get('map', '')
-    grid, gold_locations, start_pos, wumpus_locations, pits_locations = parse_map(game_map)
+    cave, gold_locations, start_pos, wumpus_locations, pits_locations = parse_map(game_map)
     free_skill_points = request_data.get("free-skill-points", 0)
     history = request_data.get("history", [])
     skill_points = request_data.get("skill-points", {})
+    if telemetry.enabled(telemetry.DEBUG):
+        telemetry.event("request", telemetry.DEBUG, step=len(history), free_skill_points=free_skill_points,
+                        skill_points=skill_points)
 
-    # Allocate skill points if needed (first action)
+    # Pick the cheapest planning strategy that fits this map
+    mode = planning_mode(game_map, free_skill_points or sum(skill_points.values()))
+
+    # Allocate skill points if needed (first action); a daemon solves the splits once for every worker
     if free_skill_points > 0:
-        skill_allocation = {"agility": free_skill_points, "fighting": 0}
-        return skill_allocation
+        skill_allocation = None
+        if PLANNER_SOCKET:
+            from policy_client import allocate  # Only needed with a daemon; no server code on this path
+            skill_allocation = allocate(PLANNER_SOCKET, game_map, free_skill_points)
+        return skill_allocation or allocate_skill_points(game_map, free_skill_points)
 
     # Extract current position and gold collected from history
     current_position = start_pos
@@ -314,57 +507,71 @@ def agent_function(request_data, request_info):
                 wumpus_pos = tuple(outcome['killed-wumpus-at'])
                 defeated_wumpus_locations.add(wumpus_pos)
 
-    # Update grid to mark defeated Wumpuses as safe
-    for (col, row) in defeated_wumpus_locations:
-        if 0 <= row < len(grid) and 0 <= col < len(grid[row]):
-            grid[row][col] = '.'  # Critical fix: Replace 'W' with '.'
-
     # Print the amount of collected gold
     # print(f"COLLECTED GOLD: {len(gold_collected)}")
 
     # Debugging: Print current position and grid
     # print(f"Current Position: {current_position}")
     # print(f"Grid Layout:")
-    # print_grid(grid, current_position)
+    # print_grid(cave, current_position)
 
     # Check if the agent is on the stairs and has collected gold
-    if grid[current_position[1]][current_position[0]] == 'S' and gold_collected:
+    current_cell = cave.at(current_position)
+    if current_cell == 'S' and gold_collected:
         return "EXIT"  # Return plain string for EXIT action
     
-    if grid[current_position[1]][current_position[0]] == 'P':
-        print("Agent fell into a pit and died.")
+    if current_cell == 'P':
+        telemetry.event("pit", telemetry.WARNING, position=current_position)
 
-    # Check if the agent is on a Wumpus and needs to fight it
-    if grid[current_position[1]][current_position[0]] == 'W' and current_position not in defeated_wumpus_locations:
+    # Check if the agent is on a Wumpus and needs to fight it (defeated ones are tracked as a set)
+    if current_cell == 'W' and current_position not in defeated_wumpus_locations:
         fighting_skill = request_data.get("skill-points", {}).get("fighting", 0)
         if fight_wumpus(fighting_skill):
-            print("Agent successfully defeats the Wumpus.")
+            telemetry.event("fight", telemetry.INFO, position=current_position, won=True)
             defeated_wumpus_locations.add(current_position)  # Mark this Wumpus as defeated
-            grid[current_position[1]][current_position[0]] = '.'  # Mark the Wumpus cell as safe
         else:
-            print("Agent failed to defeat the Wumpus and dies.")
+            telemetry.event("fight", telemetry.INFO, position=current_position, won=False)
             return "EXIT"  # Agent dies, so exit
 
-    # Compute the optimal policy using Policy Iteration
-    policy = policy_iteration(grid, gold_locations, start_pos, wumpus_locations, defeated_wumpus_locations, skill_points)
-    
-    # Override EXIT action unless all gold is collected
-    state = (current_position, frozenset(gold_collected))
-    action = policy.get(state, "NORTH")
+    # While the run goes as predicted, the stored plan already has the action
+    state = (current_position, frozenset(gold_collected), frozenset(defeated_wumpus_locations))
+    if PLAN_FOLLOWING:
+        action = follow_plan(game_map, skill_points, len(history), state)
+        if action is not None:
+            return action
+
+    # Look up the optimal action; defeated wumpuses are a factor of the planner's state.
+    # A planner this process already has beats a round trip; otherwise ask the daemon first.
+    action = None
+    planner = cache_get(_planner_cache, (game_map, skill_points.get("agility", 0), skill_points.get("fighting", 0)))
+    if planner is None and PLANNER_SOCKET:
+        from policy_client import query  # Only needed with a daemon; no server code on this path
+        action = query(PLANNER_SOCKET, game_map, skill_points, current_position, gold_collected,
+                       defeated_wumpus_locations, gold_locations, wumpus_locations)
+    if action is None:
+        planner = planner or get_planner(game_map, skill_points)
+        action = planner.action(current_position, gold_collected, defeated_wumpus_locations) or "NORTH"
 
     # Check if the next move is safe (especially for bridges)
-    next_position = get_safe_next_position(current_position, action, grid, skill_points)
+    next_position = get_safe_next_position(current_position, action, cave, skill_points)
     
     # If next_position is None, it means we can't safely cross a bridge
     if next_position is None:
-        print("Cannot safely cross bridge - looking for alternative route")
+        telemetry.event("bridge_alternative", telemetry.INFO, position=current_position, action=action)
         # Find an alternative action that doesn't lead to an unsafe bridge
         for alt_action in ACTIONS:
-            alt_next_position = get_safe_next_position(current_position, alt_action, grid, skill_points)
+            alt_next_position = get_safe_next_position(current_position, alt_action, cave, skill_points)
             if alt_next_position is not None:
                 action = alt_action
                 break
-    
+
+    # New run or a deviation (failed roll, slip, unexpected kill): store the plan from here.
+    # RTDP searches on every lookup, so focused and anytime runs are not rolled out.
+    if PLAN_FOLLOWING and planner is not None and mode not in ("focused", "anytime"):
+        cache_put(_plans, (game_map, skill_points.get("agility", 0), skill_points.get("fighting", 0)),
+                  (len(history), expected_trajectory(planner, cave, gold_locations, state, action, skill_points)),
+                  MAX_CACHED_PLANNERS)
+
     return action
 
 if __name__ == '__main__':
@@ -372,13 +579,24 @@ if __name__ == '__main__':
     import logging
     from client import run
 
-    # Set up logging
+    # Set up logging, and telemetry for the per-request events
     logging.basicConfig(level=logging.INFO)
+    telemetry.configure(level=TELEMETRY_LEVEL, path=TELEMETRY_PATH, sample=TELEMETRY_SAMPLE)
+
+    # Solve the maps we can find up front, so the first request of a run is a lookup
+    if WARM_UP:
+        warm_up(sys.argv[1])
+
+    # Optionally record every request/response to a gzip JSONL file for replay
+    agent = agent_function
+    if len(sys.argv) > 2:
+        from session_recorder import recording_agent
+        agent = recording_agent(agent_function, sys.argv[2])
 
     # Run the agent
     run(
         agent_config_file=sys.argv[1],
-        agent=agent_function,
+        agent=agent,
         parallel_runs=True,
         run_limit=100000000  # Stop after 1000 runs
     )
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""Planner over (cell, gold mask, defeated-wumpus mask) with lazy wumpus expansion.
+
+Instead of multiplying the state space by 2^wumpus up front, the defeated-wumpus
+mask is kept as a separate factor. A block for a defeated mask is only created
+when a branch of the search actually reaches a live 'W' under the current mask,
+and winning the fight (with the exact dice probability) moves into that block.
+
+A planner re-plans in place when the agent reaches a state it never solved, so
+action() and value() hold the planner's lock: threads sharing one planner wait
+for a re-plan instead of reading its half-built blocks (or a memory-mapped
+store's windows while another thread maps new ones).
+"""
+import threading
+
+from transition_model import (KIND_FIGHT, N_ACTIONS, Solution, build_transition_model,
+                              fight_probability, solve_model)
+from value_store import MemoryStore
+
+
+class FactoredPlanner:
+    """Lazily expanded planner; one solved (cell, gold mask) block per reachable defeated mask."""
+
+    def __init__(self, cave, gold_locations, agility=0, fighting=0, slip=False, models=None,
+                 store_factory=MemoryStore):
+        self.cave = cave
+        self.gold_locations = [tuple(g) for g in gold_locations]
+        self.agility = agility
+        self.fighting = fighting
+        self.slip = slip
+        self.store_factory = store_factory
+        self.wumpus_locations = cave.locations(cave.wumpus)
+        self.wumpus_bits = {pos: 1 << i for i, pos in enumerate(self.wumpus_locations)}
+        # defeated mask -> TransitionModel; models do not depend on skills and can be shared
+        self._models = {} if models is None else models
+        self._solutions = {}  # defeated mask -> Solution
+        self._reach = {}  # defeated mask -> set of solved cells
+        self._fight_values = {}  # defeated mask -> {wumpus cell: store of the block where it is dead}
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']  # Locks do not pickle; the receiving process makes its own
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def killed_mask(self, defeated_wumpus_locations):
+        mask = 0
+        for pos in defeated_wumpus_locations:
+            mask |= self.wumpus_bits.get(tuple(pos), 0)
+        return mask
+
+    def model(self, killed):
+        """Transition model with the wumpuses of `killed` treated as empty cells."""
+        model = self._models.get(killed)
+        if model is None:
+            defeated = [pos for pos, bit in self.wumpus_bits.items() if killed & bit]
+            model = self.build_model(defeated)
+            self._models[killed] = model
+        return model
+
+    def build_model(self, defeated):
+        return build_transition_model(self.cave, defeated, slip=self.slip)
+
+    def expand(self, cell, killed):
+        """Cells reachable from (cell, killed) in every defeated mask, gold ignored."""
+        can_win = fight_probability(self.fighting) > 0.0
+        reach = {killed: {cell}}
+        frontier = [(cell, killed)]
+        while frontier:
+            c, k = frontier.pop()
+            model = self.model(k)
+            for r in range(c * N_ACTIONS, c * N_ACTIONS + N_ACTIONS):
+                for e in range(model.indptr[r], model.indptr[r + 1]):
+                    t = model.targets[e]
+                    if t < 0 or (model.kinds[e] == KIND_FIGHT and not can_win):
+                        continue
+                    # Winning a fight is the only way into another block
+                    k2 = k | self.wumpus_bits[model.cells[t]] if model.kinds[e] == KIND_FIGHT else k
+                    cells = reach.setdefault(k2, set())
+                    if t not in cells:
+                        cells.add(t)
+                        frontier.append((t, k2))
+        return reach
+
+    def prepare(self, position, killed):
+        """Reset the planner to the blocks reachable from (position, killed), with empty stores.
+
+        Returns [(defeated mask, model, cells to solve, store, fight values)],
+        most wumpuses defeated first, so a block's fight values only point at
+        stores of blocks earlier in the list. Solving every block into its store
+        in that order (as plan does) leaves the planner solved.
+        """
+        cell = self.model(killed).index[tuple(position)]
+        self._reach = self.expand(cell, killed)
+        n_masks = 1 << len(self.gold_locations)
+        stores = {k: self.store_factory(n_masks, len(self.model(k).cells)) for k in self._reach}
+        self._solutions = {}
+        self._fight_values = {}
+        blocks = []
+        # A superset of defeated wumpuses always has a larger mask
+        for k in sorted(self._reach, reverse=True):
+            model = self.model(k)
+            fight_values = {model.index[pos]: stores[k | bit] for pos, bit in self.wumpus_bits.items()
+                            if not k & bit and k | bit in stores}
+            self._fight_values[k] = fight_values
+            self._solutions[k] = Solution(model, self.gold_locations, stores[k])
+            blocks.append((k, model, self._reach[k], stores[k], fight_values))
+        return blocks
+
+    def plan(self, position, killed):
+        """Solve every block reachable from (position, killed), most wumpuses defeated first."""
+        for _, model, cells, store, fight_values in self.prepare(position, killed):
+            solve_model(model, self.gold_locations, self.agility, self.fighting,
+                        active=cells, fight_values=fight_values, store=store)
+
+    def solution(self, position, defeated_wumpus_locations):
+        """Solved block for the state, re-planning from it if it was never reached."""
+        killed = self.killed_mask(defeated_wumpus_locations)
+        cell = self.model(killed).index.get(tuple(position))
+        if cell is None:
+            return None
+        if cell not in self._reach.get(killed, ()):
+            self.plan(position, killed)
+        return self._solutions[killed]
+
+    def action(self, position, gold_collected, defeated_wumpus_locations=()):
+        with self._lock:
+            solution = self.solution(position, defeated_wumpus_locations)
+            return None if solution is None else solution.action(position, gold_collected)
+
+    def value(self, position, gold_collected, defeated_wumpus_locations=()):
+        with self._lock:
+            solution = self.solution(position, defeated_wumpus_locations)
+            return 0.0 if solution is None else solution.value(position, gold_collected)
@@ -0,0 +1,235 @@
+"""Hierarchical planning over rooms separated by bridges and wumpus cells.
+
+Bridges and 'W' cells (the portals) are the only cells where a move can fail,
+and they cut most caves into rooms of plain cells. Inside a room every move is
+deterministic, so a room is solved as a shortest-path search over (cell, room
+gold collected): from an entry cell it finds the way to every exit (a step onto
+a portal, or EXIT on the stairs) for every gold subset that can be picked up on
+the way. Those paths are the edges of a small top-level MDP over (node, gold
+mask, defeated-wumpus mask), where a node is a portal or a cell where the agent
+stands in a room. Only the portal edges carry the bridge and fight
+probabilities. The top level is solved by value iteration over the nodes
+reachable from the current state; paths and nodes are cached across steps.
+
+Gold only pays on EXIT, so a shortest room path for its end state is also the
+best one as long as the rest of the run is worth more than nothing.
+It needs the deterministic rules, and a cave that portals do not split into at
+least two rooms gets nothing from it (planner_setup in example.py then uses the
+flat planner instead).
+"""
+import threading
+from collections import deque
+
+from transition_model import (ACTIONS, EPSILON, EXIT_ACTION, GAMMA,
+                              MAX_SWEEPS, STEP_REWARD, bridge_probability,
+                              exit_reward, fight_probability)
+
+
+def find_rooms(cave):
+    """(rooms as lists of flat cells, flat cell -> room, portal cells) of a cave."""
+    portals = {f for f in cave.walkable_cells() if cave.bridge[f] or cave.wumpus[f]}
+    rooms = []
+    room_of = {}
+    for f in cave.walkable_cells():
+        if f in portals or f in room_of:
+            continue
+        room_of[f] = len(rooms)
+        cells = [f]
+        stack = [f]
+        while stack:
+            c = stack.pop()
+            for n in cave.neighbor[c * 4:c * 4 + 4]:
+                if cave.walkable[n] and n not in portals and n not in room_of:
+                    room_of[n] = len(rooms)
+                    cells.append(n)
+                    stack.append(n)
+        rooms.append(cells)
+    return rooms, room_of, portals
+#---------------------------------------------------------------------------------------
+class HierarchicalPlanner:
+    """Room paths plus a top-level MDP over portals; same interface as FactoredPlanner.
+
+    `models` and other keyword arguments are accepted for interface
+    compatibility (see skill_allocation.py) and ignored.
+    """
+
+    def __init__(self, cave, gold_locations, agility=0, fighting=0, slip=False, models=None, **kwargs):
+        if slip:
+            raise ValueError("room paths need the deterministic rules")
+        self.cave = cave
+        self.gold_locations = [tuple(g) for g in gold_locations]
+        self.agility = agility
+        self.fighting = fighting
+        self.p_bridge = bridge_probability(agility)
+        self.p_fight = fight_probability(fighting)
+        self.rooms, self.room_of, self.portals = find_rooms(cave)
+        self.gold_bit = {cave.flat(g): 1 << i for i, g in enumerate(self.gold_locations) if cave.contains(g)}
+        self.room_gold = [sum(self.gold_bit.get(f, 0) for f in cells) for cells in self.rooms]
+        self.full_mask = (1 << len(self.gold_locations)) - 1
+        self.wumpus_bits = {f: 1 << i for i, f in enumerate(f for f, w in enumerate(cave.wumpus) if w)}
+        # Room cell -> [(action, portal cell or None for EXIT)]
+        self.exits = {}
+        for f in self.room_of:
+            moves = [(d, n) for d, n in enumerate(cave.neighbor[f * 4:f * 4 + 4]) if n in self.portals]
+            if cave.stairs[f]:
+                moves.append((EXIT_ACTION, None))
+            if moves:
+                self.exits[f] = moves
+        self._paths = {}  # (cell, room gold collected) -> [(return, steps, first action, gold gained, exit cell)]
+        self._options = {}  # node -> [(constant, [(coefficient, node)], action)]
+        self.V = {}  # node (flat cell, gold mask, defeated mask) -> value, kept across steps
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']  # Locks do not pickle; the receiving process makes its own
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def killed_mask(self, defeated_wumpus_locations):
+        mask = 0
+        for pos in defeated_wumpus_locations:
+            if self.cave.contains(pos):
+                mask |= self.wumpus_bits.get(self.cave.flat(pos), 0)
+        return mask
+
+    def gold_mask(self, gold_collected):
+        mask = 0
+        for bit, gold in enumerate(self.gold_locations):
+            if gold in gold_collected:
+                mask |= 1 << bit
+        return mask
+
+    def node(self, position, gold_collected, defeated_wumpus_locations=()):
+        if not self.cave.is_walkable(position):
+            return None
+        return (self.cave.flat(position), self.gold_mask(gold_collected),
+                self.killed_mask(defeated_wumpus_locations))
+
+    def paths(self, cell, mask):
+        """Shortest room paths from `cell` to every exit cell, one per gold subset picked up on the way."""
+        room_mask = mask & self.room_gold[self.room_of[cell]]
+        key = (cell, room_mask)
+        paths = self._paths.get(key)
+        if paths is None:
+            paths = self._paths[key] = self._search(cell, room_mask)
+        return paths
+
+    def _search(self, cell, mask):
+        step = self.cave.step
+        seen = {(cell, mask): (0.0, 0, None)}  # (cell, mask) -> (discounted return, steps, first action)
+        queue = deque([(cell, mask)])
+        paths = []
+        while queue:
+            c, m = queue.popleft()
+            ret, steps, first = seen[(c, m)]
+            if c in self.exits:
+                paths.append((ret, steps, first, m & ~mask, c))
+            discount = GAMMA ** steps
+            for d in range(4):
+                n = step[c * 4 + d]
+                if n == c or n in self.portals:
+                    continue
+                bit = self.gold_bit.get(n, 0)
+                state = (n, m | bit)
+                if state not in seen:
+                    seen[state] = (ret + discount * STEP_REWARD, steps + 1, d if first is None else first)
+                    queue.append(state)
+        return paths
+
+    def _enter(self, n, mask, killed):
+        """(reward, [(probability, next node)]) of one move onto walkable cell `n`; missing mass is death."""
+        if n in self.portals:
+            bit = self.wumpus_bits.get(n, 0)
+            if self.cave.bridge[n]:
+                p = self.p_bridge
+            elif killed & bit:
+                p = 1.0
+            else:
+                p, killed = self.p_fight, killed | bit
+            return STEP_REWARD, [(p, (n, mask, killed))] if p > 0.0 else []
+        return STEP_REWARD, [(1.0, (n, mask | self.gold_bit.get(n, 0), killed))]
+
+    def options(self, node):
+        """Choices at a node; the value of one is constant + sum(coefficient * V[next node])."""
+        options = self._options.get(node)
+        if options is not None:
+            return options
+        cell, mask, killed = node
+        options = []
+        if cell in self.portals:
+            for d, n in enumerate(self.cave.neighbor[cell * 4:cell * 4 + 4]):
+                if self.cave.walkable[n]:
+                    reward, nexts = self._enter(n, mask, killed)
+                    options.append((reward, [(GAMMA * p, nxt) for p, nxt in nexts], ACTIONS[d]))
+        else:
+            for ret, steps, first, gained, end in self.paths(cell, mask):
+                end_mask = mask | gained
+                discount = GAMMA ** steps
+                for a, n in self.exits[end]:
+                    action = ACTIONS[a if first is None else first]
+                    if a == EXIT_ACTION:
+                        options.append((ret + discount * (STEP_REWARD + exit_reward(end_mask, self.full_mask)),
+                                        [], action))
+                    else:
+                        reward, nexts = self._enter(n, end_mask, killed)
+                        options.append((ret + discount * reward,
+                                        [(discount * GAMMA * p, nxt) for p, nxt in nexts], action))
+        self._options[node] = options
+        return options
+
+    def _backup(self, node):
+        """(value, action) of the best option at `node` against the current top-level values."""
+        V = self.V
+        best, best_action = None, None
+        for constant, nexts, action in self.options(node):
+            total = constant
+            for coefficient, nxt in nexts:
+                total += coefficient * V[nxt]
+            if best is None or total > best:
+                best, best_action = total, action
+        return (0.0, None) if best is None else (best, best_action)
+
+    def plan(self, node):
+        """Add every node reachable from `node` to the top level and re-solve it."""
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            if n in self.V:
+                continue
+            self.V[n] = 0.0
+            for _, nexts, _ in self.options(n):
+                stack.extend(nxt for _, nxt in nexts if nxt not in self.V)
+
+        # Gauss-Seidel sweeps, larger gold masks first since masks only grow; values
+        # solved by earlier steps are a warm start
+        nodes = sorted(self.V, key=lambda n: n[1], reverse=True)
+        for _ in range(MAX_SWEEPS):
+            delta = 0.0
+            for n in nodes:
+                value = self._backup(n)[0]
+                diff = abs(value - self.V[n])
+                if diff > delta:
+                    delta = diff
+                self.V[n] = value
+            if delta < EPSILON:
+                break
+
+    def _solve(self, position, gold_collected, defeated_wumpus_locations):
+        node = self.node(position, gold_collected, defeated_wumpus_locations)
+        if node is None:
+            return 0.0, None
+        with self._lock:  # plan() grows the top level in place
+            # Cells inside a room only need their exits' values, not a top-level node of their own
+            if any(nxt not in self.V for _, nexts, _ in self.options(node) for _, nxt in nexts):
+                self.plan(node)
+            return self._backup(node)
+
+    def action(self, position, gold_collected, defeated_wumpus_locations=()):
+        return self._solve(position, gold_collected, defeated_wumpus_locations)[1]
+
+    def value(self, position, gold_collected, defeated_wumpus_locations=()):
+        return self._solve(position, gold_collected, defeated_wumpus_locations)[0]
@@ -0,0 +1,172 @@
+"""Local stand-in for the game server, for load-testing an agent offline.
+
+Plays whole games against an agent function with the same request shapes the
+server sends: the first request carries "free-skill-points" and the agent
+answers with its allocation; every later request carries "skill-points" and
+the full "history" of {"action", "outcome"} events, whose outcomes hold
+"position" and, when it happens, "collected-gold-at" and "killed-wumpus-at".
+Moves, bridges and fights are resolved by simulator.CaveRules. Many games run
+at once (threads by default, or worker processes like parallel_runs), and the
+report has per-step latency percentiles and runs per second.
+
+    python local_server.py map.txt [more.txt ...] --runs 200 --concurrency 8 [--processes]
+"""
+import argparse
+import importlib
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from session_recorder import percentile
+from simulator import CaveRules
+from transition_model import ACTIONS, DEAD, EXITED
+
+# Constants
+AGENT = "example:agent_function"  # module:function of the agent under test
+RUNS = 100
+CONCURRENCY = 4
+FREE_SKILL_POINTS = 6
+MAX_STEPS = 500
+
+_agents = {}  # "module:function" -> agent, per process
+_rules_cache = {}  # (map, agility, fighting, slip) -> CaveRules, per process
+
+
+def load_agent(spec):
+    agent = _agents.get(spec)
+    if agent is None:
+        module, function = spec.split(':')
+        agent = _agents[spec] = getattr(importlib.import_module(module), function)
+    return agent
+
+
+def _rules(game_map, skills, slip):
+    key = (game_map, skills.get("agility", 0), skills.get("fighting", 0), slip)
+    rules = _rules_cache.get(key)
+    if rules is None:
+        from example import parse_map
+        cave, gold_locations, _, _, _ = parse_map(game_map)
+        rules = _rules_cache[key] = CaveRules(cave, gold_locations, key[1], key[2], slip)
+    return rules
+#---------------------------------------------------------------------------------------
+def play_game(agent_spec, game_map, free_skill_points=FREE_SKILL_POINTS, max_steps=MAX_STEPS, slip=False,
+              seed=None, run=0):
+    """Play one game; returns {"result", "score", "latencies": [(step, seconds)]}."""
+    agent = load_agent(agent_spec)
+    rng = random.Random(seed)
+    latencies = []
+
+    def ask(request_data):
+        step = len(request_data["history"])
+        start = time.perf_counter()
+        response = agent(request_data, {"run": run, "step": step})
+        latencies.append((step, time.perf_counter() - start))
+        return response
+
+    skills = ask({"map": game_map, "free-skill-points": free_skill_points, "skill-points": {}, "history": []})
+    if not isinstance(skills, dict):
+        return {"result": "invalid", "score": 0, "latencies": latencies}
+    rules = _rules(game_map, skills, slip)
+    history = [{"action": skills, "outcome": {}}]
+
+    from example import parse_map
+    _, _, start_pos, _, _ = parse_map(game_map)
+    cell, mask, killed = rules.index[start_pos], 0, 0
+    result = "timed_out"
+    for _ in range(max_steps):
+        action = ask({"map": game_map, "free-skill-points": 0, "skill-points": skills, "history": history})
+        if action not in ACTIONS:
+            outcome = {"position": list(rules.cells[cell])}  # Unknown actions do nothing
+        else:
+            new_cell, new_mask, new_killed = rules.step(cell, mask, killed, ACTIONS.index(action), rng.random())
+            if new_cell == DEAD:
+                result = "died"
+                break
+            if new_cell == EXITED:
+                result = "exited"
+                break
+            outcome = {"position": list(rules.cells[new_cell])}
+            if new_mask != mask:
+                outcome["collected-gold-at"] = list(rules.cells[new_cell])
+            if new_killed != killed:
+                outcome["killed-wumpus-at"] = list(rules.cells[new_cell])
+            cell, mask, killed = new_cell, new_mask, new_killed
+        history = history + [{"action": action, "outcome": outcome}]
+
+    score = bin(mask).count('1') if result == "exited" else 0
+    return {"result": result, "score": score, "latencies": latencies}
+
+
+def _play_job(job):
+    return play_game(*job)
+#---------------------------------------------------------------------------------------
+def load_test(maps, agent_spec=AGENT, runs=RUNS, concurrency=CONCURRENCY, processes=False,
+              free_skill_points=FREE_SKILL_POINTS, max_steps=MAX_STEPS, slip=False, seed=0):
+    """Play `runs` games over `maps` (round robin) with `concurrency` games at once."""
+    jobs = [(agent_spec, maps[i % len(maps)], free_skill_points, max_steps, slip, seed + i, i) for i in range(runs)]
+    executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    start = time.perf_counter()
+    with executor(max_workers=concurrency) as pool:
+        games = list(pool.map(_play_job, jobs))
+    elapsed = time.perf_counter() - start
+
+    latencies = {}  # step -> [seconds]
+    results = {}
+    for game in games:
+        results[game["result"]] = results.get(game["result"], 0) + 1
+        for step, seconds in game["latencies"]:
+            latencies.setdefault(step, []).append(seconds)
+    return {
+        "runs": runs,
+        "seconds": elapsed,
+        "runs_per_second": runs / elapsed if elapsed > 0 else 0.0,
+        "requests": sum(len(v) for v in latencies.values()),
+        "results": results,
+        "mean_score": sum(game["score"] for game in games) / max(runs, 1),
+        "latencies": latencies,
+    }
+
+
+def _buckets(steps):
+    """Steps grouped as 0, 1, 2, 3-4, 5-8, 9-16, ..."""
+    buckets = {}
+    for step in steps:
+        high = 0 if step == 0 else 1 << max(0, (step - 1).bit_length())
+        low = 0 if step == 0 else high // 2 + 1
+        buckets.setdefault((low, high), []).append(step)
+    return sorted(buckets.items())
+
+
+def print_report(report):
+    print(f"{report['runs']} runs in {report['seconds']:.2f} s: {report['runs_per_second']:.2f} runs/s, "
+          f"{report['requests'] / report['seconds']:.1f} requests/s, mean score {report['mean_score']:.3f}, "
+          f"{report['results']}")
+    print(f"{'steps':>9} {'n':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    latencies = report["latencies"]
+    rows = [(f"{low}-{high}" if low != high else str(low), [s for step in steps for s in latencies[step]])
+            for (low, high), steps in _buckets(latencies)]
+    rows.append(("all", [s for values in latencies.values() for s in values]))
+    for label, values in rows:
+        if values:
+            print(f"{label:>9} {len(values):>7} {percentile(values, 50) * 1000:>9.3f} {percentile(values, 90) * 1000:>9.3f} "
+                  f"{percentile(values, 99) * 1000:>9.3f} {max(values) * 1000:>9.3f}")
+#---------------------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load-test an agent against local simulated games.")
+    parser.add_argument("maps", nargs='+', help="map files, played round robin")
+    parser.add_argument("--agent", default=AGENT, help="module:function of the agent")
+    parser.add_argument("--runs", type=int, default=RUNS)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--processes", action="store_true", help="run games in worker processes instead of threads")
+    parser.add_argument("--free-skill-points", type=int, default=FREE_SKILL_POINTS)
+    parser.add_argument("--max-steps", type=int, default=MAX_STEPS)
+    parser.add_argument("--slip", action="store_true", help="10%% left/right slips as in example(W).py")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    maps = []
+    for path in args.maps:
+        with open(path) as f:
+            maps.append(f.read())
+    print_report(load_test(maps, args.agent, args.runs, args.concurrency, args.processes,
+                           args.free_skill_points, args.max_steps, args.slip, args.seed))
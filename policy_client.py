@@ -0,0 +1,122 @@
+"""Client side of the policy_daemon.py protocol, kept free of any server code.
+
+example.py only imports this module when WUMPUS_PLANNER_SOCKET is set, and it
+imports on every platform; on one without Unix domain sockets (Windows) query()
+and allocate() simply return None and the agent solves locally.
+
+Protocol (network byte order, one reply byte per request, connections are kept open):
+    QUERY     B op=1, 16s map hash, B agility, B fighting, H column, H row,
+              I defeated-wumpus mask, Q gold mask  -> B action index
+    LOAD      B op=2, 16s map hash, I length, <length> bytes of UTF-8 map  -> B 0
+    ALLOCATE  B op=3, 16s map hash, B free skill points  -> B agility (fighting gets the rest)
+Bits of the masks follow the row-major order of parse_map's gold/wumpus lists.
+A reply of UNKNOWN_MAP asks the client to LOAD the map and ask again;
+NO_ACTION means the daemon has no answer for that request.
+"""
+import hashlib
+import socket
+import struct
+import threading
+
+# Constants
+SOCKET_PATH = "/tmp/wumpus-planner.sock"
+TIMEOUT = 5.0  # Seconds a client waits for an action before solving locally
+ALLOCATE_TIMEOUT = 120.0  # Seconds for an allocation; the daemon solves every split, as the agent would
+OP_QUERY = 1
+OP_LOAD = 2
+OP_ALLOCATE = 3
+LOADED = 0
+UNKNOWN_MAP = 254
+NO_ACTION = 255
+ACTIONS = ["NORTH", "SOUTH", "EAST", "WEST", "EXIT"]
+
+QUERY = struct.Struct('!B16sBBHHIQ')
+LOAD = struct.Struct('!B16sI')
+ALLOCATE = struct.Struct('!B16sB')
+REPLY = struct.Struct('!B')
+
+
+def map_hash(game_map):
+    return hashlib.blake2b(game_map.encode('utf-8'), digest_size=16).digest()
+
+
+def _recv_exact(sock, n):
+    data = b''
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return data
+
+
+def _mask(items, locations):
+    mask = 0
+    for bit, location in enumerate(locations):
+        if location in items:
+            mask |= 1 << bit
+    return mask
+#---------------------------------------------------------------------------------------
+_local = threading.local()  # Open connections of the client thread, per socket path
+
+
+def _connection(path):
+    connections = _local.__dict__.setdefault('connections', {})
+    sock = connections.get(path)
+    if sock is None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(TIMEOUT)
+        try:
+            sock.connect(path)
+        except OSError:
+            sock.close()
+            raise
+        connections[path] = sock
+    return sock
+
+
+def _ask(path, game_map, map_key, request, timeout=TIMEOUT):
+    """Reply byte of the daemon at `path`, loading the map once if it asks for it; None if it is unavailable."""
+    try:
+        sock = _connection(path)
+        sock.settimeout(timeout)
+        sock.sendall(request)
+        reply = REPLY.unpack(_recv_exact(sock, REPLY.size))[0]
+        if reply == UNKNOWN_MAP:
+            data = game_map.encode('utf-8')
+            sock.sendall(LOAD.pack(OP_LOAD, map_key, len(data)) + data)
+            _recv_exact(sock, REPLY.size)
+            sock.sendall(request)
+            reply = REPLY.unpack(_recv_exact(sock, REPLY.size))[0]
+    except OSError:
+        # No daemon, or a broken connection: drop it and let the caller solve locally
+        sock = _local.__dict__.get('connections', {}).pop(path, None)
+        if sock is not None:
+            sock.close()
+        return None
+    return reply
+
+
+def query(path, game_map, skill_points, position, gold_collected, defeated_wumpus_locations,
+          gold_locations, wumpus_locations):
+    """Action from the daemon at `path`, or None if it is unavailable or has no answer."""
+    if not hasattr(socket, "AF_UNIX") or len(gold_locations) > 64 or len(wumpus_locations) > 32:
+        return None
+    map_key = map_hash(game_map)
+    request = QUERY.pack(OP_QUERY, map_key, skill_points.get("agility", 0), skill_points.get("fighting", 0),
+                         position[0], position[1], _mask(defeated_wumpus_locations, wumpus_locations),
+                         _mask(gold_collected, gold_locations))
+    reply = _ask(path, game_map, map_key, request)
+    return ACTIONS[reply] if reply is not None and reply < len(ACTIONS) else None
+
+
+def allocate(path, game_map, free_skill_points):
+    """{"agility": a, "fighting": f} chosen by the daemon at `path`, or None if it is unavailable."""
+    if not hasattr(socket, "AF_UNIX") or free_skill_points > UNKNOWN_MAP - 1:
+        return None
+    map_key = map_hash(game_map)
+    reply = _ask(path, game_map, map_key, ALLOCATE.pack(OP_ALLOCATE, map_key, free_skill_points),
+                 ALLOCATE_TIMEOUT)
+    if reply is None or reply > free_skill_points:
+        return None
+    return {"agility": reply, "fighting": free_skill_points - reply}
@@ -0,0 +1,93 @@
+"""Long-lived planner daemon answering action queries over a Unix domain socket.
+
+The daemon keeps every map it has seen and its solved planners in memory (the
+same get_planner cache agent_function uses), so worker processes that start
+cold get a hot policy with one local round trip. It also chooses the skill
+allocation of a run's first request, which solves every split of the map, so
+that work is done once per machine instead of once per worker. Requests for
+one map take turns; different maps are answered in parallel. Start it once per
+machine:
+
+    python policy_daemon.py [/tmp/wumpus-planner.sock]
+
+and point example.py at it with WUMPUS_PLANNER_SOCKET=/tmp/wumpus-planner.sock.
+The protocol and the client live in policy_client.py, so that importing the
+client does not need Unix domain socket support.
+"""
+import os
+import socketserver
+import sys
+import threading
+
+from policy_client import (ACTIONS, ALLOCATE, LOAD, LOADED, NO_ACTION, OP_ALLOCATE, OP_LOAD,
+                           OP_QUERY, QUERY, REPLY, SOCKET_PATH, UNKNOWN_MAP, _recv_exact)
+
+
+class PlannerDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path=SOCKET_PATH):
+        self.maps = {}  # map hash -> map string
+        self.locks = {}  # map hash -> lock, so one map is not solved twice at once
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _Handler)
+
+    def lock(self, map_key):
+        return self.locks.get(map_key) or self.locks.setdefault(map_key, threading.Lock())
+
+    def answer(self, map_key, agility, fighting, col, row, killed, gold_mask):
+        game_map = self.maps.get(map_key)
+        if game_map is None:
+            return UNKNOWN_MAP
+        from example import get_planner, parse_map
+
+        _, gold_locations, _, wumpus_locations, _ = parse_map(game_map)
+        gold = {g for bit, g in enumerate(gold_locations) if gold_mask >> bit & 1}
+        defeated = {w for bit, w in enumerate(wumpus_locations) if killed >> bit & 1}
+        with self.lock(map_key):
+            planner = get_planner(game_map, {"agility": agility, "fighting": fighting})
+            action = planner.action((col, row), gold, defeated)
+        return NO_ACTION if action is None else ACTIONS.index(action)
+
+    def allocate(self, map_key, free_skill_points):
+        game_map = self.maps.get(map_key)
+        if game_map is None:
+            return UNKNOWN_MAP
+        from example import allocate_skill_points
+
+        with self.lock(map_key):
+            return allocate_skill_points(game_map, free_skill_points)["agility"]
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sock = self.request
+        while True:
+            try:
+                op = _recv_exact(sock, 1)
+                if op[0] == OP_QUERY:
+                    _, map_key, *fields = QUERY.unpack(op + _recv_exact(sock, QUERY.size - 1))
+                    reply = self.server.answer(map_key, *fields)
+                elif op[0] == OP_ALLOCATE:
+                    _, map_key, free_skill_points = ALLOCATE.unpack(op + _recv_exact(sock, ALLOCATE.size - 1))
+                    reply = self.server.allocate(map_key, free_skill_points)
+                elif op[0] == OP_LOAD:
+                    _, map_key, length = LOAD.unpack(op + _recv_exact(sock, LOAD.size - 1))
+                    self.server.maps[map_key] = _recv_exact(sock, length).decode('utf-8')
+                    reply = LOADED
+                else:
+                    return
+                sock.sendall(REPLY.pack(reply))
+            except ConnectionError:
+                return
+#---------------------------------------------------------------------------------------
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else SOCKET_PATH
+    server = PlannerDaemon(path)
+    print(f"Planner daemon listening on {path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
@@ -0,0 +1,180 @@
+"""Real-time dynamic programming (RTDP) from the current state only.
+
+Instead of solving every (cell, gold mask, defeated mask) state, RTDP runs
+greedy trials from the state the agent is actually in and backs up only the
+states those trials visit. Unvisited states are valued by an admissible
+(optimistic) heuristic built from BFS distances to the gold and the stairs, so
+the greedy trials are drawn towards the reachable part of the cave that matters.
+The value table is kept on the planner and reused by the next step of the run;
+trials hold the planner's lock, so threads sharing it take turns.
+"""
+import random
+import time
+from collections import deque
+
+from factored_planner import FactoredPlanner
+from transition_model import (ACTIONS, EXITED, GAMMA, KIND_EXIT,
+                              KIND_FIGHT, N_ACTIONS, bridge_probability,
+                              exit_reward, fight_probability, gold_bits)
+
+# Constants
+TIME_BUDGET = 0.05  # Seconds of trials per decision
+MAX_TRIALS = 2000
+MAX_DEPTH = 500  # Steps per trial
+RESIDUAL_EPSILON = 1e-4  # A trial whose largest Bellman residual is below this is "quiet"
+QUIET_TRIALS = 30  # Consecutive quiet trials before the root counts as converged
+
+
+class RTDPPlanner(FactoredPlanner):
+    """Focused planner sharing FactoredPlanner's lazily built models."""
+
+    def __init__(self, cave, gold_locations, agility=0, fighting=0, slip=False, seed=None, models=None,
+                 budget=TIME_BUDGET):
+        super().__init__(cave, gold_locations, agility, fighting, slip, models)
+        self.budget = budget  # Seconds of trials per decision
+        self.V = {}  # (cell, gold mask, defeated mask) -> value, kept across steps
+        self.rng = random.Random(seed)
+        self._rows = {}  # defeated mask -> weighted rows
+        base = self.model(0)
+        self.bits = gold_bits(base, self.gold_locations)
+        self.full_mask = (1 << len(self.gold_locations)) - 1
+        self._gold_distances = [(1 << bit, self._distances(base, [base.index[g]]))
+                                for bit, g in enumerate(self.gold_locations) if g in base.index]
+        self._exit_distances = self._distances(base, base.exit_cells())
+
+    @staticmethod
+    def _distances(model, sources):
+        """BFS step counts from `sources` over every cell a move can reach."""
+        dist = {c: 0 for c in sources}
+        queue = deque(sources)
+        while queue:
+            c = queue.popleft()
+            for t in model.neighbors(c):
+                if t not in dist:
+                    dist[t] = dist[c] + 1
+                    queue.append(t)
+        return dist
+
+    def heuristic(self, cell, mask):
+        """Upper bound on the value: every reachable gold carried out at the exit's BFS distance, no step costs."""
+        best_mask = mask
+        for bit, dist in self._gold_distances:
+            if not mask & bit and cell in dist:
+                best_mask |= bit
+        if cell not in self._exit_distances:
+            return 0.0
+        return exit_reward(best_mask, self.full_mask) * GAMMA ** self._exit_distances[cell]
+
+    def rows(self, killed):
+        rows = self._rows.get(killed)
+        if rows is None:
+            rows = self.model(killed).weighted_rows(bridge_probability(self.agility), fight_probability(self.fighting))
+            self._rows[killed] = rows
+        return rows
+
+    def _next_state(self, mask, k, t, kind):
+        """State after outcome `t`; None if the episode ends."""
+        if t < 0:
+            return None
+        if kind == KIND_FIGHT:
+            k |= self.wumpus_bits[self.model(k).cells[t]]
+        return (t, mask | self.bits[t], k)
+
+    def _q(self, outcomes, mask, k):
+        V = self.V
+        total = 0.0
+        for p, t, r, kind in outcomes:
+            if t == EXITED:
+                total += p * (r + exit_reward(mask, self.full_mask))
+                continue
+            s = self._next_state(mask, k, t, kind)
+            if s is None:
+                total += p * r
+                continue
+            v = V.get(s)
+            if v is None:
+                v = self.heuristic(s[0], s[1])
+            total += p * (r + GAMMA * v)
+        return total
+
+    def _greedy(self, state):
+        """Best (action, value) at `state` under the current table."""
+        c, mask, k = state
+        rows = self.rows(k)
+        best_a, best_q = None, None
+        for a in range(N_ACTIONS):
+            outcomes = rows[c * N_ACTIONS + a]
+            if outcomes:
+                q = self._q(outcomes, mask, k)
+                if best_q is None or q > best_q:
+                    best_a, best_q = a, q
+        return best_a, best_q
+
+    def trial(self, root):
+        """One greedy trial from `root`; returns the largest residual seen."""
+        residual = 0.0
+        state = root
+        for _ in range(MAX_DEPTH):
+            a, q = self._greedy(state)
+            if a is None:
+                break
+            old = self.V.get(state)
+            if old is None:
+                old = self.heuristic(state[0], state[1])
+            residual = max(residual, abs(q - old))
+            self.V[state] = q
+
+            # Sample the outcome
+            outcomes = self.rows(state[2])[state[0] * N_ACTIONS + a]
+            u = self.rng.random()
+            for p, t, r, kind in outcomes:
+                u -= p
+                if u <= 0.0:
+                    break
+            if kind == KIND_EXIT:
+                break
+            state = self._next_state(state[1], state[2], t, kind)
+            if state is None:
+                break
+        return residual
+
+    def search(self, root, budget=TIME_BUDGET):
+        deadline = time.perf_counter() + budget
+        quiet = 0
+        for _ in range(MAX_TRIALS):
+            if self.trial(root) < RESIDUAL_EPSILON:
+                quiet += 1
+                if quiet >= QUIET_TRIALS:
+                    break
+            else:
+                quiet = 0
+            if time.perf_counter() > deadline:
+                break
+
+    def state(self, position, gold_collected, defeated_wumpus_locations=()):
+        cell = self.model(0).index.get(tuple(position))
+        if cell is None:
+            return None
+        mask = 0
+        for bit, gold in enumerate(self.gold_locations):
+            if gold in gold_collected:
+                mask |= 1 << bit
+        return (cell, mask, self.killed_mask(defeated_wumpus_locations))
+
+    def action(self, position, gold_collected, defeated_wumpus_locations=(), budget=None):
+        root = self.state(position, gold_collected, defeated_wumpus_locations)
+        if root is None:
+            return None
+        with self._lock:
+            self.search(root, self.budget if budget is None else budget)
+            a, _ = self._greedy(root)
+        return None if a is None else ACTIONS[a]
+
+    def value(self, position, gold_collected, defeated_wumpus_locations=()):
+        root = self.state(position, gold_collected, defeated_wumpus_locations)
+        if root is None:
+            return 0.0
+        with self._lock:
+            if root not in self.V:
+                self.search(root, self.budget)
+            return self.V.get(root, self.heuristic(root[0], root[1]))
@@ -0,0 +1,106 @@
+"""Record server sessions and replay them through the current agent.
+
+Recording wraps an agent function and appends one JSON line per request to a
+gzip file: {"request_data", "request_info", "response", "elapsed"}. Replaying
+feeds the recorded requests back through an agent in the same order, checks
+that it still answers the same, and reports the latency of every step (step =
+number of events in the request's history).
+
+    python session_recorder.py replay sessions.jsonl.gz [more.jsonl.gz ...]
+"""
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+
+
+#---------------------------------------------------------------------------------------
+def _normalise(value):
+    """Value as it reads back from JSON (tuples become lists, unknown objects their repr)."""
+    return json.loads(json.dumps(value, default=repr))
+
+
+def recording_agent(agent, path):
+    """Wrap `agent` so every call is appended to the gzip JSONL file at `path`.
+
+    A "{pid}" in `path` is replaced by the id of the process that writes the
+    line, so worker processes forked after wrapping each write their own file.
+    """
+    locks = {}  # pid -> lock; a forked worker must not inherit a lock its parent held
+
+    def recorded(request_data, request_info):
+        start = time.perf_counter()
+        response = agent(request_data, request_info)
+        elapsed = time.perf_counter() - start
+        pid = os.getpid()
+        lock = locks.get(pid) or locks.setdefault(pid, threading.Lock())
+        line = json.dumps({
+            "request_data": request_data,
+            "request_info": request_info,
+            "response": response,
+            "elapsed": elapsed,
+        }, default=repr)
+        with lock:
+            with gzip.open(path.replace("{pid}", str(pid)), 'at', encoding='utf-8') as f:
+                f.write(line + '\n')
+        return response
+
+    return recorded
+#---------------------------------------------------------------------------------------
+def load_session(path):
+    """Yield the recorded requests of one file in order."""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def replay(paths, agent):
+    """Feed recorded sessions through `agent`; returns mismatches and per-step latencies."""
+    mismatches = []
+    latencies = {}  # step -> [seconds]
+    recorded_latencies = {}
+    for path in paths:
+        for n, record in enumerate(load_session(path)):
+            request_data = record["request_data"]
+            start = time.perf_counter()
+            response = agent(request_data, record.get("request_info"))
+            elapsed = time.perf_counter() - start
+
+            step = len(request_data.get("history", []))
+            latencies.setdefault(step, []).append(elapsed)
+            recorded_latencies.setdefault(step, []).append(record.get("elapsed", 0.0))
+            if _normalise(response) != record["response"]:
+                mismatches.append((path, n, step, record["response"], response))
+    return {"mismatches": mismatches, "latencies": latencies, "recorded_latencies": recorded_latencies}
+
+
+def print_report(report):
+    requests = sum(len(v) for v in report["latencies"].values())
+    print(f"{requests} requests, {len(report['mismatches'])} mismatched actions")
+    for path, n, step, expected, actual in report["mismatches"]:
+        print(f"  {path} #{n} (step {step}): recorded {expected!r}, now {actual!r}")
+    print(f"{'step':>5} {'n':>5} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'rec p50':>9}")
+    for step in sorted(report["latencies"]):
+        values = report["latencies"][step]
+        recorded = report["recorded_latencies"][step]
+        print(f"{step:>5} {len(values):>5} {percentile(values, 50) * 1000:>9.3f} {percentile(values, 90) * 1000:>9.3f} "
+              f"{percentile(values, 99) * 1000:>9.3f} {max(values) * 1000:>9.3f} {percentile(recorded, 50) * 1000:>9.3f}")
+#---------------------------------------------------------------------------------------
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] != "replay":
+        print("usage: python session_recorder.py replay SESSION.jsonl.gz [...]")
+        sys.exit(2)
+
+    from example import agent_function
+    report = replay(sys.argv[2:], agent_function)
+    print_report(report)
+    sys.exit(1 if report["mismatches"] else 0)
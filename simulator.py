@@ -0,0 +1,155 @@
+"""Local Monte Carlo simulator for scoring a policy offline.
+
+The rules are the ones the planner models: moves as in get_safe_next_position
+(walls block), stepping into a pit kills, entering a bridge or a live wumpus
+rolls the agility or fighting dice (best three d6 against 12 or 13; the outcome
+is drawn from the exact distribution of that roll), gold is picked up on entry
+and EXIT on the stairs scores one point per gold carried out.
+
+All episodes advance in lockstep, one step per tick, with their states kept in
+flat arrays. The policy is only queried once per distinct state, so thousands
+of episodes cost little more than the states they visit.
+"""
+import random
+import statistics
+import sys
+from array import array
+
+from transition_model import (ACTIONS, DEAD, EXITED, KIND_FIGHT, N_ACTIONS,
+                              build_transition_model, bridge_probability,
+                              fight_probability, gold_bits)
+
+# Constants
+EPISODES = 1000
+MAX_STEPS = 500  # Episodes still in the cave after this many steps score 0
+FREE_SKILL_POINTS = 6  # Points the command-line scorer allocates, as in local_test.py
+
+
+class CaveRules:
+    """Sampling tables for one map and skill allocation, one per defeated-wumpus mask."""
+
+    def __init__(self, cave, gold_locations, agility=0, fighting=0, slip=False):
+        self.cave = cave
+        self.gold_locations = [tuple(g) for g in gold_locations]
+        self.slip = slip
+        self.p_bridge = bridge_probability(agility)
+        self.p_fight = fight_probability(fighting)
+        self.wumpus_locations = cave.locations(cave.wumpus)
+        self.wumpus_bits = {pos: 1 << i for i, pos in enumerate(self.wumpus_locations)}
+        self._tables = {}  # defeated mask -> per-row (cumulative probabilities, outcomes)
+        self.model = build_transition_model(cave, slip=slip)
+        self.cells = self.model.cells
+        self.index = self.model.index
+        self.bits = gold_bits(self.model, self.gold_locations)
+
+    def table(self, killed):
+        table = self._tables.get(killed)
+        if table is None:
+            model = self.model
+            if killed:
+                defeated = [pos for pos, bit in self.wumpus_bits.items() if killed & bit]
+                model = build_transition_model(self.cave, defeated, slip=self.slip)
+            table = []
+            for outcomes in model.weighted_rows(self.p_bridge, self.p_fight):
+                cumulative = []
+                total = 0.0
+                for p, _, _, _ in outcomes:
+                    total += p
+                    cumulative.append(total)
+                table.append((cumulative, outcomes))
+            self._tables[killed] = table
+        return table
+
+    def step(self, cell, mask, killed, action, u):
+        """Advance one state with uniform draw `u`; returns (cell, mask, killed) with DEAD/EXITED cells at the end."""
+        cumulative, outcomes = self.table(killed)[cell * N_ACTIONS + action]
+        if not outcomes:
+            return cell, mask, killed  # Invalid action (EXIT off the stairs) does nothing
+        i = 0
+        while i < len(cumulative) - 1 and u >= cumulative[i]:
+            i += 1
+        _, t, _, kind = outcomes[i]
+        if t < 0:
+            return t, mask, killed
+        if kind == KIND_FIGHT:
+            killed |= self.wumpus_bits[self.cells[t]]
+        return t, mask | self.bits[t], killed
+
+    def state_key(self, cell, mask, killed):
+        """(position, gold_collected, defeated_wumpus_locations) as the agent sees them."""
+        gold = frozenset(g for bit, g in enumerate(self.gold_locations) if mask >> bit & 1)
+        defeated = frozenset(pos for pos, bit in self.wumpus_bits.items() if killed & bit)
+        return self.cells[cell], gold, defeated
+#---------------------------------------------------------------------------------------
+def planner_policy(planner):
+    """Adapt a planner (FactoredPlanner, RTDPPlanner, ...) to the simulator's policy signature."""
+    def policy(position, gold_collected, defeated_wumpus_locations):
+        return planner.action(position, gold_collected, defeated_wumpus_locations)
+    return policy
+#---------------------------------------------------------------------------------------
+def simulate(cave, gold_locations, start_pos, policy, agility=0, fighting=0, episodes=EPISODES,
+             max_steps=MAX_STEPS, slip=False, seed=None):
+    """Roll out `policy(position, gold_collected, defeated) -> action` and summarise the scores."""
+    rules = CaveRules(cave, gold_locations, agility, fighting, slip)
+    rng = random.Random(seed)
+    start = rules.index[tuple(start_pos)]
+
+    cells = array('i', [start]) * episodes
+    masks = array('q', [0]) * episodes
+    killed = array('q', [0]) * episodes
+    scores = array('d', [0.0]) * episodes
+    active = list(range(episodes))
+    died = 0
+    actions = {}  # (cell, mask, killed) -> action index
+
+    for _ in range(max_steps):
+        if not active:
+            break
+        still_active = []
+        for i in active:
+            state = (cells[i], masks[i], killed[i])
+            a = actions.get(state)
+            if a is None:
+                name = policy(*rules.state_key(*state))
+                a = ACTIONS.index(name) if name in ACTIONS else 0
+                actions[state] = a
+            c, m, k = rules.step(state[0], state[1], state[2], a, rng.random())
+            if c == EXITED:
+                scores[i] = bin(m).count('1')
+            elif c == DEAD:
+                died += 1
+            else:
+                cells[i], masks[i], killed[i] = c, m, k
+                still_active.append(i)
+        active = still_active
+
+    return {
+        "episodes": episodes,
+        "mean": statistics.fmean(scores),
+        "variance": statistics.pvariance(scores),
+        "exited": episodes - died - len(active),
+        "died": died,
+        "timed_out": len(active),
+        "states": len(actions),
+    }
+#---------------------------------------------------------------------------------------
+def main(map_files, episodes=EPISODES, free_skill_points=FREE_SKILL_POINTS):
+    """Score the agent's own skill allocation and planner on each map file."""
+    from example import SLIP_MOVES, get_planner, parse_map
+    from skill_allocation import best_skill_allocation
+
+    for path in map_files:
+        with open(path) as f:
+            game_map = f.read()
+        cave, gold_locations, start_pos, _, _ = parse_map(game_map)
+        skills, _ = best_skill_allocation(game_map, cave, gold_locations, start_pos, free_skill_points,
+                                          slip=SLIP_MOVES)
+        planner = get_planner(game_map, skills)
+        stats = simulate(cave, gold_locations, start_pos, planner_policy(planner),
+                         skills["agility"], skills["fighting"], episodes, slip=SLIP_MOVES)
+        print(f"{path}: skills={skills} mean={stats['mean']:.3f} var={stats['variance']:.3f} "
+              f"exited={stats['exited']} died={stats['died']} timed_out={stats['timed_out']}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,103 @@
+"""Choose the agility/fighting split by the expected return of the best policy.
+
+Every split of the free skill points only changes the bridge and fight success
+probabilities, so all splits share one set of compiled transition models and
+splits that lead to the same probabilities are solved once. Results are cached
+per map (the most recently used MAX_CACHED_ALLOCATIONS of them).
+
+An RTDP planner's value at the start is an upper bound until its trials have
+converged, which takes longer than the whole solve RTDP is there to avoid. Its
+splits are therefore ranked by an exact proxy instead: the value of the same
+cave with only the gold nearest to the start, as many pieces as keep that
+solve within PROXY_STATES states. The proxy still prices every bridge and
+fight on the way to that gold, and it is a lower bound of the real value.
+"""
+from collections import OrderedDict, deque
+
+from factored_planner import FactoredPlanner
+from rtdp import RTDPPlanner
+from transition_model import bridge_probability, fight_probability
+
+# Constants
+MAX_CACHED_ALLOCATIONS = 32
+PROXY_STATES = 10_000  # (cell, gold mask, defeated mask) states of the exact proxy for RTDP splits
+
+# (map, free points, slip, planner class) -> (allocation, planner of the chosen split)
+_allocation_cache = OrderedDict()
+
+
+def remember_allocation(key, result):
+    """Cache an allocation result, dropping the least recently used ones above MAX_CACHED_ALLOCATIONS."""
+    _allocation_cache[key] = result
+    _allocation_cache.move_to_end(key)
+    while len(_allocation_cache) > MAX_CACHED_ALLOCATIONS:
+        _allocation_cache.popitem(last=False)
+
+
+def best_skill_allocation(game_map, cave, gold_locations, start_pos, free_skill_points, slip=False,
+                          planner_class=FactoredPlanner, planners=None, **planner_options):
+    """Return ({"agility": a, "fighting": f}, solved planner) maximising the value at the start.
+
+    If `planners` is a dict it receives the solved planner of every split,
+    keyed by (agility, fighting). `planner_options` go to the planner class.
+    """
+    key = (game_map, free_skill_points, slip, planner_class)
+    cached = _allocation_cache.get(key)
+    if cached is not None and planners is None:
+        return cached
+
+    has_bridge = any(cave.bridge)
+    has_wumpus = any(cave.wumpus)
+    models = {}
+    distinct = {}  # effective probabilities -> planner
+    splits = []
+    for agility in range(free_skill_points, -1, -1):
+        fighting = free_skill_points - agility
+        probabilities = (bridge_probability(agility) if has_bridge else None,
+                         fight_probability(fighting) if has_wumpus else None)
+        if probabilities not in distinct:
+            distinct[probabilities] = planner_class(cave, gold_locations, agility, fighting, slip=slip,
+                                                    models=models, **planner_options)
+        splits.append((agility, fighting, distinct[probabilities]))
+
+    # RTDP values are upper bounds until converged; score those splits by the exact proxy
+    scorers = {}
+    if issubclass(planner_class, RTDPPlanner):
+        proxy_gold = nearest_gold(cave, gold_locations, start_pos)
+        proxy_models = {}
+        for planner in distinct.values():
+            scorers[planner] = FactoredPlanner(cave, proxy_gold, planner.agility, planner.fighting, slip=slip,
+                                               models=proxy_models)
+
+    # Ties go to agility, the previous fixed allocation
+    best = None
+    for agility, fighting, planner in splits:
+        if planners is not None:
+            planners[(agility, fighting)] = planner
+        score = scorers.get(planner, planner).value(start_pos, ())
+        if best is None or score > best[0]:
+            best = (score, {"agility": agility, "fighting": fighting}, planner)
+
+    result = (best[1], best[2])
+    remember_allocation(key, result)
+    return result
+
+
+def nearest_gold(cave, gold_locations, start_pos, max_states=PROXY_STATES):
+    """The gold closest to `start_pos` (in steps), as many as fit cells x 2^gold x 2^wumpus <= `max_states`."""
+    start = cave.flat(start_pos)
+    distance = {start: 0}
+    queue = deque([start])
+    while queue:
+        f = queue.popleft()
+        for n in cave.neighbor[f * 4:f * 4 + 4]:
+            if cave.walkable[n] and n not in distance:
+                distance[n] = distance[f] + 1
+                queue.append(n)
+    states = sum(cave.walkable) << sum(cave.wumpus)
+    reachable = sorted((distance[cave.flat(g)], i) for i, g in enumerate(gold_locations)
+                       if cave.contains(g) and cave.flat(g) in distance)
+    count = 0
+    while count < len(reachable) and states << count + 1 <= max_states:
+        count += 1
+    return [gold_locations[i] for _, i in sorted(reachable[:count], key=lambda d: d[1])]
@@ -0,0 +1,85 @@
+"""Estimate the size of a cave's planning problem and pick the cheapest solver that fits.
+
+The estimate only needs the parsed map and the skill points: walkable cells
+(corridor cells drop out under the deterministic rules), gold pieces and
+wumpuses (every gold and defeated-wumpus mask is a block of the solve), the
+rooms and portals that the hierarchical planner routes between, and how many
+skill splits the first request has to solve (see skill_allocation.py). The
+hierarchical planner also searches room paths from every entry cell for every
+subset of the room's gold already collected; each search covers the room's
+cells times the subsets still to collect, cells x 3^room gold per entry in all. Strategies, cheapest
+adequate first:
+
+    exhaustive    whole-map value iteration (corridor-compressed when deterministic)
+    hierarchical  room paths and a top-level MDP over bridges and wumpus cells
+    focused       RTDP from the current state with the default time budget
+    anytime       RTDP that uses the whole per-request budget and plays its best guess
+"""
+from corridors import corridor_cells
+from hierarchy import find_rooms
+from transition_model import bridge_probability, fight_probability
+
+# Constants
+EXHAUSTIVE_SECONDS = 2.0  # Largest estimated up-front solve (all skill splits) at the first request
+FOCUSED_STATES = 2_000_000  # Beyond this RTDP trials rarely converge within one decision
+SECONDS_PER_STATE = 1e-5  # Measured whole-map solve time per (cell, gold mask, defeated mask)
+SECONDS_PER_ROUTING_STATE = 4e-5  # Measured hierarchical solve time per (portal node, masks)
+SECONDS_PER_ROOM_STATE = 3e-6  # Measured room path search time per (cell, room gold) visited
+BYTES_PER_STATE = 9  # float64 value + uint8 action in memory
+STRATEGIES = ("exhaustive", "hierarchical", "focused", "anytime")
+
+
+def estimate_state_space(cave, gold_locations, slip=False, skill_points=0):
+    """Size, memory and solve-time (per skill split) estimate of a cave's planning problem."""
+    cells = sum(cave.walkable)
+    wumpuses = sum(cave.wumpus)
+    bridges = sum(cave.bridge)
+    # Splits with the same effective probabilities are solved once
+    splits = len({(bridge_probability(a) if bridges else None,
+                   fight_probability(skill_points - a) if wumpuses else None) for a in range(skill_points + 1)})
+    # Worst case: every wumpus can be fought, so every defeated mask gets a block
+    blocks = (1 << len(gold_locations)) << wumpuses
+    solved = cells if slip else cells - len(corridor_cells(cave))
+
+    rooms, room_of, portals = find_rooms(cave)
+    gold_cells = {cave.flat(g) for g in gold_locations if cave.contains(g)}
+    entries = 0
+    room_states = 0
+    for room in rooms:
+        room_entries = sum(1 for f in room if any(n in portals for n in cave.neighbor[f * 4:f * 4 + 4]))
+        room_gold = sum(1 for f in room if f in gold_cells)
+        entries += room_entries
+        room_states += room_entries * len(room) * 3 ** room_gold
+        if any(cave.stairs[f] for f in room):
+            # The start cell only searches with none of the gold collected
+            room_states += len(room) << room_gold
+    routing_states = (len(portals) + entries + 1) * blocks
+
+    return {
+        "cells": cells,
+        "gold": len(gold_locations),
+        "wumpuses": wumpuses,
+        "bridges": bridges,
+        "rooms": len(rooms),
+        "splits": splits,
+        "deterministic": not slip,
+        "states": solved * blocks,
+        "bytes": solved * blocks * BYTES_PER_STATE,
+        "seconds": solved * blocks * SECONDS_PER_STATE,
+        "routing_states": routing_states,
+        "room_states": room_states,
+        "routing_seconds": routing_states * SECONDS_PER_ROUTING_STATE + room_states * SECONDS_PER_ROOM_STATE,
+    }
+
+
+def select_strategy(estimate):
+    """Cheapest strategy in STRATEGIES expected to play well for the estimate."""
+    if estimate["seconds"] * estimate["splits"] <= EXHAUSTIVE_SECONDS:
+        return "exhaustive"
+    # Routing only pays off when portals actually split the cave into rooms
+    if estimate["deterministic"] and estimate["rooms"] > 1 and \
+            estimate["routing_seconds"] * estimate["splits"] <= EXHAUSTIVE_SECONDS:
+        return "hierarchical"
+    if estimate["states"] <= FOCUSED_STATES:
+        return "focused"
+    return "anytime"
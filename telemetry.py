@@ -0,0 +1,122 @@
+"""Buffered structured telemetry for the agent's hot path.
+
+event(name, level, **fields) appends one dict to an in-memory ring buffer (a
+deque with a maximum length, so a burst never blocks and only drops the oldest
+events); a background thread writes the buffer out as JSON lines every
+FLUSH_INTERVAL seconds. Until configure() is called every level is off, and an
+event below the level, or skipped by its sample rate, costs one comparison.
+
+    telemetry.configure(level=telemetry.INFO, path="telemetry-{pid}.jsonl", sample={"bridge_roll": 0.1})
+
+A "{pid}" in the path is replaced by the process id, so parallel worker
+processes each write their own file; without a path events go to stdout.
+"""
+import atexit
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+# Levels (same values as the logging module)
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+CAPACITY = 10000  # Buffered events before the oldest are dropped
+FLUSH_INTERVAL = 0.5  # Seconds between background flushes
+
+_level = OFF
+_rates = {}  # event name -> fraction of events kept
+_buffer = deque(maxlen=CAPACITY)
+_path = None
+_stream = None
+_interval = FLUSH_INTERVAL
+_lock = threading.Lock()  # One writer at a time
+_thread = None
+
+
+def enabled(level):
+    """Whether events at `level` are recorded; guard expensive field computations with it."""
+    return level >= _level
+
+
+def event(name, level=INFO, **fields):
+    """Record one event unless its level is off or sampling skips it."""
+    if level < _level:
+        return
+    rate = _rates.get(name)
+    if rate is not None and random.random() >= rate:
+        return
+    fields["event"] = name
+    fields["level"] = LEVEL_NAMES.get(level, level)
+    fields["time"] = time.time()
+    _buffer.append(fields)
+
+
+def flush():
+    """Write every buffered event as one JSON line each."""
+    with _lock:
+        lines = []
+        while _buffer:
+            lines.append(json.dumps(_buffer.popleft(), default=repr))
+        if not lines:
+            return
+        stream = _stream or sys.stdout
+        stream.write('\n'.join(lines) + '\n')
+        stream.flush()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(_interval)
+        try:
+            flush()
+        except (OSError, ValueError):
+            # A full disk or a closed stream drops this batch, not the thread
+            pass
+
+
+def _start():
+    """Open the output of this process and start its flush thread if it is not running."""
+    global _stream, _thread
+    stream = open(_path.replace("{pid}", str(os.getpid())), 'a', encoding='utf-8') if _path else None
+    with _lock:
+        if _stream is not None:
+            _stream.close()
+        _stream = stream
+    if _thread is None or not _thread.is_alive():
+        _thread = threading.Thread(target=_flush_loop, name="telemetry-flush", daemon=True)
+        _thread.start()
+
+
+def _after_fork():
+    # Threads do not survive a fork; a worker starts its own buffer, file and thread
+    global _lock, _stream
+    _lock = threading.Lock()
+    _buffer.clear()
+    _stream = None  # The parent's file object; the parent closes it
+    if _level < OFF:
+        _start()
+
+
+def configure(level=INFO, path=None, sample=None, capacity=CAPACITY, interval=FLUSH_INTERVAL):
+    """Enable telemetry from `level` up; `sample` maps event names to the fraction kept."""
+    global _level, _rates, _buffer, _path, _interval
+    flush()
+    _level = level
+    _rates = dict(sample or {})
+    _buffer = deque(_buffer, maxlen=capacity)
+    _path = path
+    _interval = interval
+    _start()
+
+
+if hasattr(os, "register_at_fork"):  # Unix only; Windows workers are spawned and import this afresh
+    os.register_at_fork(after_in_child=_after_fork)
+atexit.register(flush)
@@ -0,0 +1,360 @@
+"""Sparse transition model for the cave MDP.
+
+The outcomes of every (cell, action) pair are built once into CSR-style arrays
+(`indptr`, `targets`, `probs`, `rewards`, `kinds`). Both the deterministic rules
+of example.py and the 10% left/right slip rules of example(W).py compile into
+the same layout, so the solver below does not care which rules are in use.
+"""
+from array import array
+from functools import lru_cache
+
+from value_store import MemoryStore
+
+# Constants
+GAMMA = 0.99  # Same discount factor as example.py
+EPSILON = 1e-6  # Convergence threshold
+MAX_SWEEPS = 5000  # Safety cap on Gauss-Seidel sweeps per gold mask
+ACTIONS = ["NORTH", "SOUTH", "EAST", "WEST", "EXIT"]
+N_ACTIONS = len(ACTIONS)
+EXIT_ACTION = 4
+NO_ACTION = 255  # Policy entry for cells that were not solved
+
+LEFT_OF = [3, 2, 0, 1]  # NORTH->WEST, SOUTH->EAST, EAST->NORTH, WEST->SOUTH
+RIGHT_OF = [2, 3, 1, 0]  # NORTH->EAST, SOUTH->WEST, EAST->SOUTH, WEST->NORTH
+SLIP_PROB = 0.1  # Chance of slipping to each side under the stochastic rules
+
+BRIDGE_THRESHOLD = 12  # Top three agility dice needed to cross a bridge
+FIGHT_THRESHOLD = 13  # Top three fighting dice needed to kill a wumpus
+
+# Rewards (same scale as get_reward in example.py). The game scores one point per
+# gold carried out and nothing on death or when the run never leaves, so gold only
+# pays on EXIT, GOLD_REWARD + EXIT_GOLD_REWARD per piece. get_reward's +10 on
+# pick-up was kept even if the agent died afterwards, and its +100 all-gold bonus
+# is left out; both made the planner risk the carried gold for one more point.
+STEP_REWARD = -0.1
+BUMP_REWARD = -0.5
+GOLD_REWARD = 10
+EXIT_GOLD_REWARD = 10
+
+# Special targets
+DEAD = -1  # Fell into a pit, off a bridge or lost a fight
+EXITED = -2  # Left the cave through the stairs
+
+# Outcome kinds; the skill checks scale the base probability of an outcome
+KIND_MOVE = 0  # Base probability as is
+KIND_BRIDGE = 1  # Times the bridge success probability
+KIND_FALL = 2  # Times the bridge failure probability
+KIND_FIGHT = 3  # Times the fight success probability
+KIND_EATEN = 4  # Times the fight failure probability
+KIND_EXIT = 5  # EXIT from the stairs
+
+
+#---------------------------------------------------------------------------------------
+@lru_cache(maxsize=None)
+def skill_check_probability(dice, threshold):
+    """Exact probability that the best three of `dice` d6 sum to at least `threshold`."""
+    if dice <= 0:
+        return 0.0
+    # Distribution over the (sorted) top three dice seen so far
+    states = {(): 1.0}
+    for _ in range(dice):
+        next_states = {}
+        for top, p in states.items():
+            for face in range(1, 7):
+                key = tuple(sorted(top + (face,), reverse=True)[:3])
+                next_states[key] = next_states.get(key, 0.0) + p / 6
+        states = next_states
+    return sum(p for top, p in states.items() if sum(top) >= threshold)
+
+
+def bridge_probability(agility):
+    return skill_check_probability(agility, BRIDGE_THRESHOLD)
+
+
+def fight_probability(fighting):
+    return skill_check_probability(fighting, FIGHT_THRESHOLD)
+#---------------------------------------------------------------------------------------
+class TransitionModel:
+    """CSR transition table; row `cell * N_ACTIONS + action` holds that pair's outcomes."""
+
+    def __init__(self, cells, indptr, targets, probs, rewards, kinds, slip, nodes=None):
+        self.cells = cells  # Compact cell index -> (column, row)
+        self.index = {pos: i for i, pos in enumerate(cells)}
+        self.indptr = indptr
+        self.targets = targets
+        self.probs = probs
+        self.rewards = rewards
+        self.kinds = kinds
+        self.slip = slip
+        # Compressed models only: the cells that are not inside a corridor. Their
+        # rows are macro moves with discounted weights and cannot be sampled.
+        self.nodes = nodes
+
+    def weighted_rows(self, p_bridge, p_fight):
+        """Per-row outcome lists [(prob, target, reward, kind)] with the skill checks applied."""
+        factors = (1.0, p_bridge, 1.0 - p_bridge, p_fight, 1.0 - p_fight, 1.0)
+        indptr, targets, probs, rewards, kinds = self.indptr, self.targets, self.probs, self.rewards, self.kinds
+        rows = []
+        for r in range(len(indptr) - 1):
+            outcomes = []
+            for e in range(indptr[r], indptr[r + 1]):
+                p = probs[e] * factors[kinds[e]]
+                if p > 0.0:
+                    outcomes.append((p, targets[e], rewards[e], kinds[e]))
+            rows.append(outcomes)
+        return rows
+
+    def exit_cells(self):
+        """Cells where EXIT is available (the stairs)."""
+        return [c for c in range(len(self.cells))
+                if self.indptr[c * N_ACTIONS + EXIT_ACTION + 1] > self.indptr[c * N_ACTIONS + EXIT_ACTION]]
+
+    def neighbors(self, cell):
+        """Cells reachable from `cell` in one step under any skill allocation."""
+        result = set()
+        for r in range(cell * N_ACTIONS, cell * N_ACTIONS + N_ACTIONS):
+            for e in range(self.indptr[r], self.indptr[r + 1]):
+                if self.targets[e] >= 0:
+                    result.add(self.targets[e])
+        return result
+#---------------------------------------------------------------------------------------
+def build_transition_model(cave, defeated_wumpus_locations=(), slip=False, corridors=None, gamma=GAMMA):
+    """Compile a CaveMap into a TransitionModel (walls block, pits kill, bridges and live wumpuses roll dice).
+
+    With `corridors` (flat corridor cells, see corridors.py; deterministic rules
+    only) a move into a corridor follows it to the cell at its other end as one
+    macro move of L steps. Its entry weight is gamma^(L-1) and its reward is the
+    discounted step cost divided by that weight, so the solver's usual
+    p * (r + [gold] + gamma * V) backup is exactly the L-step return.
+    """
+    defeated = {cave.flat(pos) for pos in defeated_wumpus_locations if cave.contains(pos)}
+    flats = cave.walkable_cells()
+    compact = {f: i for i, f in enumerate(flats)}
+    neighbor = cave.neighbor
+
+    indptr = array('i', [0])
+    targets = array('i')
+    probs = array('d')
+    rewards = array('d')
+    kinds = array('b')
+
+    def add(target, prob, reward, kind):
+        targets.append(target)
+        probs.append(prob)
+        rewards.append(reward)
+        kinds.append(kind)
+
+    def enter(f, n, prob, reward=STEP_REWARD):
+        """Append the outcomes of stepping from flat cell `f` into flat cell `n`."""
+        if cave.wall[n]:
+            add(compact[f], prob, reward + BUMP_REWARD, KIND_MOVE)
+        elif cave.pit[n]:
+            add(DEAD, prob, reward, KIND_MOVE)
+        elif cave.bridge[n]:
+            add(compact[n], prob, reward, KIND_BRIDGE)
+            add(DEAD, prob, reward, KIND_FALL)
+        elif cave.wumpus[n] and n not in defeated:
+            add(compact[n], prob, reward, KIND_FIGHT)
+            add(DEAD, prob, reward, KIND_EATEN)
+        else:
+            add(compact[n], prob, reward, KIND_MOVE)
+
+    def follow(f, n):
+        """Append the macro move from `f` through the corridor starting at `n`."""
+        prev, steps = f, 1
+        while n in corridors and n != f:
+            ahead = [m for m in neighbor[n * 4:n * 4 + 4] if cave.walkable[m] and m != prev]
+            prev, n = n, ahead[0]
+            steps += 1
+        weight = gamma ** (steps - 1)
+        enter(f, n, weight, STEP_REWARD * sum(gamma ** k for k in range(steps)) / weight)
+
+    for f in flats:
+        for a in range(4):
+            forward = neighbor[f * 4 + a]
+            if corridors and f in corridors:
+                # Inside a corridor only the two ways along it are actions
+                if cave.walkable[forward]:
+                    follow(f, forward)
+            elif corridors and forward in corridors:
+                follow(f, forward)
+            elif not slip or cave.wall[forward]:
+                enter(f, forward, 1.0)
+            else:
+                # Slips into a wall do not happen; that mass stays on the intended move
+                forward_prob = 1.0
+                for side in (LEFT_OF[a], RIGHT_OF[a]):
+                    n = neighbor[f * 4 + side]
+                    if not cave.wall[n]:
+                        enter(f, n, SLIP_PROB)
+                        forward_prob -= SLIP_PROB
+                enter(f, forward, forward_prob)
+            indptr.append(len(targets))
+
+        # EXIT is only available on the stairs
+        if cave.stairs[f]:
+            add(EXITED, 1.0, STEP_REWARD, KIND_EXIT)
+        indptr.append(len(targets))
+
+    cells = [cave.position(f) for f in flats]
+    nodes = None if corridors is None else {compact[f] for f in flats if f not in corridors}
+    return TransitionModel(cells, indptr, targets, probs, rewards, kinds, slip, nodes)
+#---------------------------------------------------------------------------------------
+class Solution:
+    """Values and greedy policy of a solved model, one block per gold mask."""
+
+    def __init__(self, model, gold_locations, store):
+        self.model = model
+        self.gold_locations = [tuple(g) for g in gold_locations]
+        self.store = store  # store.values(mask)[cell], store.policy(mask)[cell] -> action index
+
+    def mask(self, gold_collected):
+        mask = 0
+        for bit, gold in enumerate(self.gold_locations):
+            if gold in gold_collected:
+                mask |= 1 << bit
+        return mask
+
+    def value(self, position, gold_collected):
+        cell = self.model.index.get(tuple(position))
+        if cell is None:
+            return 0.0
+        return self.store.values(self.mask(gold_collected))[cell]
+
+    def lookahead(self, rows, cell, mask, fight_values=None, gamma=GAMMA):
+        """Best action at a cell the solver skipped, by one backup against the solved blocks."""
+        bits = gold_bits(self.model, self.gold_locations)
+        full_mask = (1 << len(self.gold_locations)) - 1
+        supersets = {bit: self.store.values(mask | bit) for bit in set(bits) if bit and not mask & bit}
+        fight_blocks = {t: child.values(mask) for t, child in (fight_values or {}).items()}
+        V = self.store.values(mask)
+        best_a, best = None, None
+        for a in range(N_ACTIONS):
+            outcomes = rows[cell * N_ACTIONS + a]
+            if outcomes:
+                total = backup(outcomes, mask, V, supersets, bits, exit_reward(mask, full_mask), gamma, fight_blocks)
+                if best is None or total > best:
+                    best_a, best = a, total
+        return None if best_a is None else ACTIONS[best_a]
+
+    def action(self, position, gold_collected):
+        """Best action for the state, or None if the state is not covered."""
+        cell = self.model.index.get(tuple(position))
+        if cell is None:
+            return None
+        a = self.store.policy(self.mask(gold_collected))[cell]
+        return None if a == NO_ACTION else ACTIONS[a]
+#---------------------------------------------------------------------------------------
+def exit_reward(mask, full_mask):
+    return bin(mask).count('1') * (GOLD_REWARD + EXIT_GOLD_REWARD)
+
+
+def gold_bits(model, gold_locations):
+    """Gold bit of every compact cell (0 for cells without gold)."""
+    bits = [0] * len(model.cells)
+    for bit, gold in enumerate(gold_locations):
+        cell = model.index.get(tuple(gold))
+        if cell is not None:
+            bits[cell] = 1 << bit
+    return bits
+
+
+def backup(outcomes, mask, V, supersets, bits, exit_value, gamma, fight_blocks):
+    """Expected return of one (cell, action) row in gold mask `mask`.
+
+    `supersets[bit]` is the value block of `mask | bit`, `fight_blocks[cell]`
+    the value block (same mask) after the wumpus on `cell` is dead.
+    Picking up gold only moves into the superset block; it pays on EXIT.
+    """
+    total = 0.0
+    for p, t, r, kind in outcomes:
+        if t >= 0:
+            bit = bits[t]
+            if bit and not mask & bit:
+                total += p * (r + gamma * supersets[bit][t])
+            elif kind == KIND_FIGHT and t in fight_blocks:
+                total += p * (r + gamma * fight_blocks[t][t])
+            else:
+                total += p * (r + gamma * V[t])
+        elif t == EXITED:
+            total += p * (r + exit_value)
+        else:
+            total += p * r
+    return total
+
+
+def sweep(rows, cells, mask, V, supersets, bits, exit_value, gamma, fight_blocks):
+    """One in-place Gauss-Seidel sweep over `cells` of a gold-mask block; returns the largest change."""
+    delta = 0.0
+    for c in cells:
+        base = c * N_ACTIONS
+        best = None
+        for a in range(N_ACTIONS):
+            outcomes = rows[base + a]
+            if outcomes:
+                total = backup(outcomes, mask, V, supersets, bits, exit_value, gamma, fight_blocks)
+                if best is None or total > best:
+                    best = total
+        if best is not None:
+            diff = abs(best - V[c])
+            if diff > delta:
+                delta = diff
+            V[c] = best
+    return delta
+
+
+def greedy_policy(rows, cells, mask, V, supersets, bits, exit_value, gamma, fight_blocks):
+    """Greedy action per cell of a solved block (NO_ACTION outside `cells`)."""
+    P = bytearray([NO_ACTION]) * len(V)
+    for c in cells:
+        base = c * N_ACTIONS
+        best = None
+        for a in range(N_ACTIONS):
+            outcomes = rows[base + a]
+            if outcomes:
+                total = backup(outcomes, mask, V, supersets, bits, exit_value, gamma, fight_blocks)
+                if best is None or total > best:
+                    best = total
+                    P[c] = a
+    return P
+
+
+def solve_model(model, gold_locations, agility=0, fighting=0, gamma=GAMMA, epsilon=EPSILON,
+                active=None, fight_values=None, store_factory=MemoryStore, store=None):
+    """Value iteration over (cell, gold mask) using the sparse model.
+
+    Gold masks only ever grow, so masks are solved from the full mask down and
+    each block only iterates its own cells, reading just the blocks with one
+    more gold from the store. `active` restricts the sweep to a subset of
+    cells; `fight_values` maps a wumpus cell to the store of the state in which
+    that wumpus is dead (see factored_planner.py). `store_factory(n_masks,
+    n_cells)` creates the block storage (see value_store.py) unless an empty
+    `store` is given.
+    """
+    rows = model.weighted_rows(bridge_probability(agility), fight_probability(fighting))
+    n = len(model.cells)
+    bits = gold_bits(model, gold_locations)
+    full_mask = (1 << len(gold_locations)) - 1
+    cells = list(range(n)) if active is None else sorted(active)
+
+    gold_in_model = [bit for bit in set(bits) if bit]
+    fight_values = fight_values or {}
+
+    if store is None:
+        store = store_factory(full_mask + 1, n)
+    for mask in range(full_mask, -1, -1):
+        V = array('d', bytes(8 * n))
+        exit_value = exit_reward(mask, full_mask)
+        supersets = {bit: store.values(mask | bit) for bit in gold_in_model if not mask & bit}
+        fight_blocks = {t: child.values(mask) for t, child in fight_values.items()}
+
+        # Gauss-Seidel sweeps, alternating direction to propagate along corridors
+        order = cells
+        for _ in range(MAX_SWEEPS):
+            if sweep(rows, order, mask, V, supersets, bits, exit_value, gamma, fight_blocks) < epsilon:
+                break
+            order = order[::-1]
+
+        store.write(mask, V, greedy_policy(rows, cells, mask, V, supersets, bits, exit_value, gamma, fight_blocks))
+
+    return Solution(model, gold_locations, store)
@@ -0,0 +1,91 @@
+"""Storage backends for the solver's value and policy blocks (one block per gold mask).
+
+MemoryStore keeps every block in RAM. MemmapStore keeps values as float32 and
+policies as uint8 in a memory-mapped temporary file and only keeps a bounded
+number of windows of blocks mapped at a time, so caves with many gold pieces (2^gold
+blocks) can be solved with a fixed working set.
+"""
+import mmap
+import tempfile
+from array import array
+from collections import OrderedDict
+
+WORKING_SET_BYTES = 64 * 2**20  # Default mapped bytes per MemmapStore
+MAX_WINDOWS = 16  # Mapped windows per MemmapStore (one file descriptor each on Unix)
+
+
+class MemoryStore:
+    """Every block in memory: float64 values, uint8 policy."""
+
+    def __init__(self, n_masks, n_cells):
+        self.n_cells = n_cells
+        self._values = [None] * n_masks
+        self._policy = [None] * n_masks
+
+    def values(self, mask):
+        return self._values[mask]
+
+    def policy(self, mask):
+        return self._policy[mask]
+
+    def write(self, mask, values, policy):
+        self._values[mask] = values
+        self._policy[mask] = policy
+
+
+class MemmapStore:
+    """Blocks in a memory-mapped file, mapped a window of consecutive blocks at a time.
+
+    A block is [n_cells float32 values][n_cells uint8 actions], rounded up to
+    4 bytes, and blocks are packed back to back into windows of about
+    `working_set_bytes` / MAX_WINDOWS (at least one mmap allocation unit);
+    only the end of a window is padded to the allocation granularity. Every
+    mapping holds a file descriptor on Unix, so the number of mapped windows
+    is capped by a fixed count. The solver needs a block and its one-gold-more
+    supersets at the same time, so the cap never drops below gold + 2 windows.
+    """
+
+    def __init__(self, n_masks, n_cells, directory=None, working_set_bytes=WORKING_SET_BYTES):
+        self.n_cells = n_cells
+        self.block_bytes = max(-(-n_cells * 5 // 4) * 4, 4)
+        gold = max(n_masks - 1, 0).bit_length()
+        self.max_windows = max(gold + 2, MAX_WINDOWS)
+        granularity = mmap.ALLOCATIONGRANULARITY
+        # At least one allocation unit per window, so small blocks are never padded one by one
+        window_blocks = max(working_set_bytes // self.max_windows, granularity, self.block_bytes) // self.block_bytes
+        self.window_blocks = min(window_blocks, max(n_masks, 1))
+        self.window_bytes = -(-self.window_blocks * self.block_bytes // granularity) * granularity
+        self._file = tempfile.TemporaryFile(dir=directory)
+        self._file.truncate(self.window_bytes * -(-max(n_masks, 1) // self.window_blocks))
+        self._mapped = OrderedDict()  # window -> mmap
+
+    def _block(self, mask):
+        window, slot = divmod(mask, self.window_blocks)
+        mm = self._mapped.get(window)
+        if mm is not None:
+            self._mapped.move_to_end(window)
+        else:
+            while len(self._mapped) >= self.max_windows:
+                # Unmapped as soon as no caller holds a view of it any more
+                self._mapped.popitem(last=False)
+            mm = mmap.mmap(self._file.fileno(), self.window_bytes, offset=window * self.window_bytes)
+            self._mapped[window] = mm
+        n = self.n_cells
+        start = slot * self.block_bytes
+        with memoryview(mm) as view:
+            return view[start:start + n * 4].cast('f'), view[start + n * 4:start + n * 5]
+
+    def values(self, mask):
+        return self._block(mask)[0]
+
+    def policy(self, mask):
+        return self._block(mask)[1]
+
+    def write(self, mask, values, policy):
+        value_view, policy_view = self._block(mask)
+        value_view[:] = array('f', values)
+        policy_view[:] = policy
+
+    def close(self):
+        self._mapped.clear()
+        self._file.close()